@@ -1,115 +1,374 @@
-import os
-import requests
-from requests.adapters import HTTPAdapter
-from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
-import csv
-import datetime
-import re
-import logging
 import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import aiohttp
+from tqdm import tqdm
 
-from urllib3 import Retry
+from cli import build_parser, configure_client
+from client import fetch_text, stream_page_async, trace_config
+from courses import (
+    get_item_data as get_carried_item_data,
+    has_details,
+    parse_pages_count,
+    parse_items_urls,
+    parse_weekly_views,
+)
+from extract import WeeklyViewsScanner, use_extractor
+from limits import LimitReached, limit
+from profiling import profile_run
+from refresh import (
+    RefreshState,
+    add_refresh_arguments,
+    merge_pages,
+    plan_pages,
+)
+from stats import stats
+from storage import History, open_history, run
 
-ua = UserAgent()
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
-# session = requests.Session()
-retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
-# session.mount("http://", adapter)
-# session.mount("https://", adapter)
-requests.packages.urllib3.disable_warnings(
-    requests.packages.urllib3.exceptions.InsecureRequestWarning
-)
-logging.basicConfig(level=logging.INFO)
-
-
-async def get_pages_count(session, home_url):
-    response = await session.get(url=home_url, headers=headers)
-    soup = BeautifulSoup(await response.text(), "lxml")
-
-    navigation_panel = soup.find("div", class_="navigation")
-    navigation_titles = navigation_panel.find_all("a")
-    return int(navigation_titles[-2].text)
-
-
-async def get_page_data(session, url_page):
-    async with session.get(url=url_page, headers=headers) as response_page:
-        soup = BeautifulSoup(await response_page.text(), "lxml")
-
-        items = soup.find_all("div", class_="catalog__item")
-        if len(items) == 0:
-            items = soup.find_all("div", class_="courses-cards__list__item")
-
-        page_items = []
-        i = 0
-        tasks = []
-        for item in items:
-            logging.info(f"Item {i+1}/{len(items)}, {url_page}")
-            item_url = item.find("a", class_="catalog__item__link")
-            task = asyncio.create_task(get_item_data(session, item, item_url))
-            tasks.append(task)
-            # item_data = await task
-            # if item_data != None:
-            #     print("Added", item_data)
-            #     page_items.append(item_data)
-            # else:
-            #     logging.info(f"Item {i+1} skipped")
-            i += 1
-        await asyncio.gather(*tasks)
-        return page_items
-
-
-async def get_item_data(session, item, item_url):
-    if item_url == None:
-        item_url = item.find("a", class_="course-card__wrap")
-    item_url = item_url.get("href")
-    if "away.php" in item_url:
+
+
+def parse_in_worker(function, html: str) -> tuple:
+    """Run parser in pool worker, get its result and parse timings"""
+
+    stats.reset()
+    result = function(html)
+    timings = {
+        name: histogram["sum"]
+        for name, histogram in stats.snapshot()["histograms"].items()
+    }
+    return result, timings
+
+
+async def parse(executor: ProcessPoolExecutor | None, function, html: str):
+    """Run parser in process pool, or in event loop without pool
+
+    Only html goes to the worker and only extracted data comes back,
+    with the parse.* timings of the worker. Time spent in the pool,
+    transfer included, goes to parse.pool.
+    """
+
+    if executor == None:
+        return function(html)
+    loop = asyncio.get_running_loop()
+    with stats.timer("parse.pool"):
+        result, timings = await loop.run_in_executor(
+            executor, parse_in_worker, function, html
+        )
+    for name, seconds in timings.items():
+        stats.observe(name, seconds)
+    return result
+
+
+async def get_weekly_views(
+    session: aiohttp.ClientSession,
+    url_item: str,
+    executor: ProcessPoolExecutor | None = None,
+    stream: bool = False,
+) -> str | None:
+    """Get weekly views of course page, see `courses.get_weekly_views`"""
+
+    if not stream:
+        html = await fetch_text(session, url_item, headers)
+        return await parse(executor, parse_weekly_views, html)
+
+    scanner = WeeklyViewsScanner()
+    html = await stream_page_async(session, url_item, headers, scanner)
+    if html == None:
+        stats.count("stream.stopped_early")
+        return scanner.value
+    return await parse(executor, parse_weekly_views, html)
+
+
+async def get_item_data(
+    session: aiohttp.ClientSession,
+    item_url: str,
+    refresh: RefreshState | None = None,
+    executor: ProcessPoolExecutor | None = None,
+    stream: bool = False,
+) -> list[str] | None:
+    """Get item data or None, fresh items are taken from refresh state"""
+
+    if not has_details(item_url):
+        stats.count("skip.away")
         return None
 
-    async with session.get(
-        url=f"https://info-hit.ru{item_url}", headers=headers
-    ) as response_item:
-        soup = BeautifulSoup(await response_item.text(), "lxml")
+    if refresh != None and not refresh.is_stale(item_url):
+        stats.count("skip.fresh")
+        weekly_views = refresh.last_value(item_url)
+    else:
+        weekly_views = await get_weekly_views(
+            session, f"https://info-hit.ru{item_url}", executor, stream
+        )
+        if refresh != None:
+            refresh.update(item_url, weekly_views)
 
+    if weekly_views == None:
+        stats.count("skip.no_rating")
+        return None
+
+    return [item_url, weekly_views]
+
+
+async def get_page_data(
+    session: aiohttp.ClientSession,
+    url_page: str,
+    refresh: RefreshState | None = None,
+    html: str | None = None,
+    executor: ProcessPoolExecutor | None = None,
+    stream: bool = False,
+) -> list[list[str]]:
+    """Get data of all items on page, in page order
+
+    `html` of already fetched page is parsed without request.
+    """
+
+    if html == None:
+        html = await fetch_text(session, url_page, headers)
+
+    items_urls = await parse(executor, parse_items_urls, html)
+    items_data = await asyncio.gather(
+        *[
+            get_item_data(session, item_url, refresh, executor, stream)
+            for item_url in items_urls
+        ]
+    )
+    return [item_data for item_data in items_data if item_data != None]
+
+
+async def gather_prioritized(
+    session: aiohttp.ClientSession,
+    url: str,
+    first_page: str,
+    pages: range,
+    history: History,
+    refresh: RefreshState | None,
+    concurrency: int,
+    executor: ProcessPoolExecutor | None,
+    stream: bool,
+) -> None:
+    """Read catalog pages, fetch course pages by priority, merge catalog
+
+    See `courses.gather_prioritized`, up to `concurrency` pages are
+    fetched at once.
+    """
+
+    async def get_page_urls(page: int) -> list[str]:
+        html = first_page
+        if page != 1:
+            html = await fetch_text(session, f"{url}/?PAGEN_1={page}", headers)
+        return await parse(executor, parse_items_urls, html)
+
+    async def get_planned_data(item_url: str) -> list[str] | None:
         try:
-            weekly_views = re.search(
-                r"\d+",
-                soup.find("span", class_="cp-hero__rating-text").text,
-            ).group()
-        except Exception as e:
+            return await get_item_data(
+                session, item_url, refresh, executor, stream
+            )
+        except LimitReached:
+            # left out, its row is marked when the run is finished
+            stats.count("skip.limit")
             return None
 
-        return [item_url, weekly_views]
+    pages_urls = []
+    try:
+        for start in range(0, len(pages), concurrency):
+            results = await asyncio.gather(
+                *[
+                    get_page_urls(page)
+                    for page in pages[start : start + concurrency]
+                ],
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+                pages_urls.append(result)
+    except LimitReached:
+        pass
+
+    planned = plan_pages(pages_urls, refresh, has_details)
+    items_data = {}
+    for start in range(0, len(planned), concurrency):
+        chunk = planned[start : start + concurrency]
+        results = await asyncio.gather(
+            *[get_planned_data(item_url) for item_url in chunk]
+        )
+        items_data.update(zip(chunk, results))
+    merge_pages(
+        history,
+        pages,
+        pages_urls,
+        items_data,
+        lambda item_url: get_carried_item_data(item_url, refresh),
+    )
+
+
+async def gather_data(
+    url: str,
+    csv_filename: str,
+    concurrency: int = 20,
+    per_host: int = 10,
+    checkpoint_every: int = 20,
+    storage: str = "csv",
+    resume: bool = False,
+    refresh: RefreshState | None = None,
+    parse_workers: int = 0,
+    stream: bool = False,
+    parser: str = "lxml",
+) -> None:
+    """Gather all data
+
+    Requests are limited by the connection pool: at most `concurrency`
+    in flight, at most `per_host` to one host, and by the adaptive
+    per-host throttle. Up to `concurrency` pages are fetched ahead, pages
+    are merged into history in page order. With `parse_workers` html is
+    parsed in a process pool of that size instead of the event loop, the
+    workers extract with `parser` backend.
+    With `stream` course pages are downloaded only up to the rating.
+    With budget of `refresh` or a run limit course pages are fetched by
+    priority, see `courses.gather_data`.
+    """
+
+    executor = None
+    if parse_workers > 0:
+        # forked workers may inherit locks held by other threads
+        # (e.g. stats.lock) and hang, forkserver starts them clean
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        executor = ProcessPoolExecutor(
+            parse_workers,
+            mp_context=context,
+            initializer=use_extractor,
+            initargs=(parser,),
+        )
+
+    connector = aiohttp.TCPConnector(
+        limit=concurrency, limit_per_host=per_host, ssl=False
+    )
+    async with aiohttp.ClientSession(
+        connector=connector, trace_configs=[trace_config()]
+    ) as session:
+        first_page = await fetch_text(session, f"{url}/?PAGEN_1=1", headers)
+        pages = await parse(executor, parse_pages_count, first_page)
 
+        history = open_history(
+            storage, csv_filename, checkpoint_every=checkpoint_every
+        )
+        with run(history, resume) as progress:
+            if refresh != None:
+                refresh.start_run(history.timestamp)
+            pages_range = range(progress.get("page", 0) + 1, pages + 1)
+            pages_ahead = iter(pages_range)
+            tasks = deque()
+            try:
+                prioritized = refresh != None and refresh.budget != None
+                if limit.active or prioritized:
+                    await gather_prioritized(
+                        session,
+                        url,
+                        first_page,
+                        pages_range,
+                        history,
+                        refresh,
+                        concurrency,
+                        executor,
+                        stream,
+                    )
+                else:
+                    for page in tqdm(pages_range):
+                        for page_ahead in pages_ahead:
+                            url_page = f"{url}/?PAGEN_1={page_ahead}"
+                            html = first_page if page_ahead == 1 else None
+                            tasks.append(
+                                asyncio.create_task(
+                                    get_page_data(
+                                        session,
+                                        url_page,
+                                        refresh,
+                                        html,
+                                        executor,
+                                        stream,
+                                    )
+                                )
+                            )
+                            if len(tasks) >= concurrency:
+                                break
+                        stats.set_gauge("queue.pages", len(tasks))
+                        history.merge(
+                            await tasks.popleft(), progress={"page": page}
+                        )
+            finally:
+                for task in tasks:
+                    task.cancel()
+                if refresh != None:
+                    refresh.save()
+                if executor != None:
+                    executor.shutdown(cancel_futures=True)
 
-async def gather_data():
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        url = "https://info-hit.ru/catalog"
-        pages = await get_pages_count(session, url)
-        start_page = 1
-        first_page = True if start_page == 1 else False
 
-        tasks = []
-        for page in range(start_page, pages + 1):
-            logging.info(f"Page {page}/{pages}")
-            url_page = f"{url}/?PAGEN_1={page}"
-            task = asyncio.create_task(get_page_data(session, url_page))
-            tasks.append(task)
-            # page_data = await task
-            # data_to_csv("csv/courses.csv", page_data, first_page)
-            first_page = False
+def main() -> None:
+    """Main function"""
 
-        await asyncio.gather(*tasks)
+    parser = build_parser(
+        "Gather courses weekly views with asyncio",
+        url="https://info-hit.ru/catalog",
+        filename="E:/courses.csv",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=20,
+        help="max requests in flight",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=10,
+        help="max requests in flight to one host",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="processes parsing html (0 - parse in event loop)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stop downloading course pages once the rating is read",
+    )
+    add_refresh_arguments(parser)
+    args = parser.parse_args()
+    configure_client(args)
 
+    refresh = None
+    if args.incremental or args.budget != None:
+        refresh = RefreshState(
+            args.output, args.hot_views, args.cold_every, args.budget
+        )
 
-def main():
-    asyncio.run(gather_data())
+    with profile_run(args):
+        asyncio.run(
+            gather_data(
+                url=args.url,
+                csv_filename=args.output,
+                concurrency=args.concurrency,
+                per_host=args.per_host,
+                checkpoint_every=args.checkpoint_every,
+                storage=args.storage,
+                resume=args.resume,
+                refresh=refresh,
+                parse_workers=args.parse_workers,
+                stream=args.stream,
+                parser=args.parser,
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -1,195 +1,159 @@
-import os
-import requests
-from requests.adapters import HTTPAdapter
-from bs4 import BeautifulSoup
-from anti_useragent import UserAgent
-import csv
-import datetime
 from tqdm import tqdm
 
-from urllib3 import Retry
+from cli import build_parser, configure_client
+from client import create_session, mount_adapter
+from extract import extractor
+from pipeline import Pipeline, add_pipeline_arguments
+from profiling import profile_run
+from stats import stats
+from storage import History, open_history, run
 
-ua = UserAgent()
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
-session = requests.Session()
-retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-requests.packages.urllib3.disable_warnings(
-    requests.packages.urllib3.exceptions.InsecureRequestWarning
-)
+session = create_session()
 
 
-def get_pages_count(home_url: str) -> int:
-    """Get pages count"""
+def parse_pages_count(html: str) -> int:
+    """Get pages count from authors page"""
 
-    response = session.get(url=home_url, headers=headers, verify=False)
+    with stats.timer("parse.authors"):
+        return extractor().pages_count(html)
 
-    soup = BeautifulSoup(response.text, "lxml")
 
-    navigation_panel = soup.find("div", class_="navigation")
-    navigation_titles = navigation_panel.find_all("a")
-    return int(navigation_titles[-2].text)
+def get_first_page(url: str) -> tuple[str, int]:
+    """Get first authors page and pages count read from it"""
 
+    response = session.get(
+        url=f"{url}/?PAGEN_1=1", headers=headers, verify=False
+    )
+    return response.text, parse_pages_count(response.text)
 
-def get_headers(filename: str) -> list[str]:
-    """Get csv file header row"""
-
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        return next(reader)
-
-
-def add_headers(filename: str, headers: list[str]) -> None:
-    """Add headers to csv file"""
-
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(headers)
-
-
-def get_csv(filename: str) -> list[list[str]]:
-    """Get all data from csv"""
-
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        csv_data = [item for item in reader]
-        return csv_data
-
-
-def create_csv(filename: str, data: list[str]) -> None:
-    """Create csv file with data"""
-
-    header = ["", datetime.datetime.now(), ""]
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data:
-            writer.writerow(item)
-
-
-def add_to_csv(filename: str, data: list[str]) -> None:
-    """Add data to csv file"""
-
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        for item in data:
-            writer.writerow(item)
 
+def get_items_data(html: str) -> list[list[str]]:
+    """Get data of all items of authors page html"""
 
-def new_iteration_csv(filename: str, data: list[str]) -> None:
-    """Add new headers to csv at new parser iteration"""
+    with stats.timer("parse.authors"):
+        return extractor().authors(html)
 
-    header = get_headers(filename)
-    header.append(str(datetime.datetime.now()))
-    header.append("")
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data[1:]:
-            writer.writerow(item)
 
+def get_page(url_page: str) -> str:
+    """Get authors page text"""
 
-def data_to_csv(
-    filename: str, data: list[str], first_dataframe: bool = False
-) -> None:
-    """Add data to csv file or create it"""
-
-    if not os.path.exists(filename):
-        create_csv(filename, data)
-    else:
-        if first_dataframe == True:
-            new_iteration_csv(filename, get_csv(filename))
-
-        csv_data = get_csv(filename)
-
-        headers_len = len(get_headers(filename))
-        for data_item in data:
-            for i, csv_item in enumerate(csv_data):
-                if data_item[0] == csv_item[0]:
-                    if len(csv_item) == headers_len - 2:
-                        csv_data[i].append(data_item[1])
-                        csv_data[i].append(data_item[2])
-                    break
-            else:
-                if headers_len == len(data_item):
-                    csv_data.append(data_item)
-                elif headers_len > len(data_item):
-                    csv_data.append(
-                        [
-                            data_item[0],
-                            *[""] * (headers_len - len(data_item)),
-                            data_item[1],
-                            data_item[2],
-                        ]
-                    )
-        add_to_csv(filename, csv_data)
-
-
-def get_item_data(item) -> list[str]:
-    """Get item data"""
-
-    item_name = item.find("div", class_="author-item-name").text
-    item_li = (
-        item.find("div", class_="author-item-stat")
-        .find("ul")
-        .find_all("li")[:2]
-    )
-    try:
-        item_views = item_li[0].find("span").text
-    except:
-        item_views = 0
-    try:
-        item_revs = item_li[1].find("span").text
-    except:
-        item_revs = 0
-    return [item_name, item_views, item_revs]
+    response_page = session.get(url=url_page, headers=headers, verify=False)
+    return response_page.text
 
 
 def get_page_data(url_page: str) -> list[list[str]]:
     """Get data of all items on page"""
 
-    response_page = session.get(url=url_page, headers=headers, verify=False)
-
-    soup = BeautifulSoup(response_page.text, "lxml")
-
-    items = soup.find_all("div", class_="author-item_wrap")
+    return get_items_data(get_page(url_page))
 
-    page_items = []
-    i = 0
-    for item in items:
-        item_data = get_item_data(item)
-        if item_data != None:
-            page_items.append(item_data)
-        i += 1
 
-    return page_items
+def gather_pipelined(
+    url: str,
+    first_page: str,
+    pages: range,
+    history: History,
+    fetch_workers: int,
+    parse_workers: int,
+    queue_size: int,
+) -> None:
+    """Fetch, parse and merge authors pages in concurrent stages"""
+
+    def fetch(page: int, _) -> str:
+        if page == 1:
+            return first_page
+        return get_page(f"{url}/?PAGEN_1={page}")
+
+    pipeline = Pipeline(
+        [
+            ("fetch", fetch, fetch_workers),
+            ("parse", lambda page, html: get_items_data(html), parse_workers),
+        ],
+        queue_size,
+    )
+    with tqdm(total=len(pages)) as bar:
 
+        def write(page: int, page_data: list[list[str]]) -> None:
+            history.merge(page_data, progress={"page": page})
+            bar.update()
 
-def gather_data(url: str, csv_filename: str) -> None:
-    """Gather all data"""
+        pipeline.run(pages, write)
 
-    pages = get_pages_count(url)
 
-    first_page = True
-    for page in tqdm(range(1, pages + 1)):
-        url_page = f"{url}/?PAGEN_1={page}"
-        page_data = get_page_data(url_page)
-        data_to_csv(csv_filename, page_data, first_page)
-        first_page = False
+def gather_data(
+    url: str,
+    csv_filename: str,
+    checkpoint_every: int = 20,
+    storage: str = "csv",
+    resume: bool = False,
+    fetch_workers: int = 0,
+    parse_workers: int = 1,
+    queue_size: int = 8,
+) -> None:
+    """Gather all data
+
+    With `fetch_workers` pages go through the staged pipeline. When the
+    run limit is reached pages read so far are merged, the rest of the
+    authors are marked as not refreshed and the run is finished.
+    """
+
+    if fetch_workers > 0:
+        mount_adapter(session, fetch_workers)
+    first_page, pages = get_first_page(url)
+
+    history = open_history(
+        storage,
+        csv_filename,
+        values_count=2,
+        checkpoint_every=checkpoint_every,
+    )
+    with run(history, resume) as progress:
+        pages_range = range(progress.get("page", 0) + 1, pages + 1)
+        if fetch_workers > 0:
+            gather_pipelined(
+                url,
+                first_page,
+                pages_range,
+                history,
+                fetch_workers,
+                parse_workers,
+                queue_size,
+            )
+        else:
+            for page in tqdm(pages_range):
+                if page == 1:
+                    page_data = get_items_data(first_page)
+                else:
+                    url_page = f"{url}/?PAGEN_1={page}"
+                    page_data = get_page_data(url_page)
+                history.merge(page_data, progress={"page": page})
 
 
 def main() -> None:
     """Main function"""
 
-    gather_data(
+    parser = build_parser(
+        "Gather authors views and reviews",
         url="https://info-hit.ru/authors/",
-        csv_filename="E:/authors.csv",
+        filename="E:/authors.csv",
     )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    configure_client(args)
+
+    with profile_run(args):
+        gather_data(
+            url=args.url,
+            csv_filename=args.output,
+            checkpoint_every=args.checkpoint_every,
+            storage=args.storage,
+            resume=args.resume,
+            fetch_workers=args.fetch_workers,
+            parse_workers=args.parse_workers,
+            queue_size=args.queue_size,
+        )
 
 
 if __name__ == "__main__":
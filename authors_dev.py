@@ -1,8 +1,6 @@
 import os
 import requests
-from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 import csv
 import datetime
 import logging
@@ -10,14 +8,16 @@ from tqdm import tqdm
 
 from urllib3 import Retry
 
-ua = UserAgent()
+from client import UserAgentAdapter
+from stats import stats
+
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
 session = requests.Session()
 retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
+# user agent is taken from the pool on the first request
+adapter = UserAgentAdapter(max_retries=retry)
 session.mount("http://", adapter)
 session.mount("https://", adapter)
 requests.packages.urllib3.disable_warnings(
@@ -140,15 +140,13 @@ def get_page_data(url_page) -> list[list[str]]:
     items = soup.find_all("div", class_="author-item_wrap")
 
     page_items = []
-    i = 0
     for item in items:
-        logging.info(f"Item {i+1}/{len(items)}")
         item_data = get_item_data(item)
+        stats.count("items")
         if item_data != None:
             page_items.append(item_data)
         else:
-            logging.info(f"Item {i+1} skipped")
-        i += 1
+            stats.count("skip.item")
 
     return page_items
 
@@ -161,7 +159,8 @@ def get_data(url, start_page=1):
         logging.info(f"Page {page}/{pages}")
         url_page = f"{url}/?PAGEN_1={page}"
         page_data = get_page_data(url_page)
-        data_to_csv("csv/authors.csv", page_data, first_page)
+        with stats.timer("history.merge"):
+            data_to_csv("csv/authors.csv", page_data, first_page)
         first_page = False
 
 
@@ -172,6 +171,7 @@ def main():
     )
     end_time = datetime.datetime.now()
     print("Duration: {}".format(end_time - start_time))
+    print(stats.progress_line())
 
 
 if __name__ == "__main__":
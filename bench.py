@@ -0,0 +1,313 @@
+import os
+import csv
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+
+import a_courses
+import client
+import courses
+from extract import EXTRACTORS
+from fixtures import load_fixtures
+from history import CsvHistory
+from mock_site import MockSite, serve_in_thread
+
+MERGE_ROWS = [1000, 10000, 100000]
+MERGE_COLUMNS = [10, 50, 200]
+PAGE_SIZE = 20
+
+# page type -> (marker of its html, extractor method parsing it)
+PAGE_TYPES = {
+    "course": (b"cp-hero__rating-text", "weekly_views"),
+    "catalog": (b"catalog__item", "items_urls"),
+    "authors": (b"author-item_wrap", "authors"),
+    "threads": (b"discussionListItem", "threads"),
+}
+
+
+def best_time(function, repeat: int = 3) -> float:
+    """Get best of `repeat` run times of function, s"""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def synthetic_pages() -> dict[str, list[str]]:
+    """Get mock site pages of every type"""
+
+    site = MockSite(items_per_page=30, threads_per_page=30, page_size=60000)
+    return {
+        "course": [site.course(number) for number in range(1, 10)],
+        "catalog": [site.catalog(page) for page in range(1, 4)],
+        "authors": [site.authors(page) for page in range(1, 4)],
+        "threads": [site.section(1, page) for page in range(1, 4)],
+    }
+
+
+def fixture_pages(filename: str) -> dict[str, list[str]]:
+    """Get recorded pages grouped by type"""
+
+    pages = {page_type: [] for page_type in PAGE_TYPES}
+    for fixture in load_fixtures(filename).values():
+        for page_type, (marker, _) in PAGE_TYPES.items():
+            if marker in fixture.body:
+                html = fixture.body.decode("utf-8", "replace")
+                pages[page_type].append(html)
+                break
+    return pages
+
+
+def bench_parse(pages: dict[str, list[str]], repeat: int = 3) -> dict:
+    """Measure parse throughput of every backend and page type"""
+
+    results = {}
+    for name, extractor in EXTRACTORS.items():
+        for page_type, htmls in pages.items():
+            if len(htmls) == 0:
+                continue
+            parse = getattr(extractor, PAGE_TYPES[page_type][1])
+            seconds = best_time(
+                lambda: [parse(html) for html in htmls], repeat
+            )
+            size = sum(len(html) for html in htmls)
+            results[f"parse.{name}.{page_type}.pages_per_s"] = (
+                len(htmls) / seconds
+            )
+            results[f"parse.{name}.{page_type}.mb_per_s"] = (
+                size / seconds / 1e6
+            )
+    return results
+
+
+def write_history(filename: str, rows: int, columns: int) -> None:
+    """Write history file with `rows` items and `columns` snapshots"""
+
+    with open(filename, "w", encoding="Windows-1251", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            [""] + [f"2023-01-01 00:00:{column}" for column in range(columns)]
+        )
+        for row in range(rows):
+            writer.writerow(
+                [f"/course/{row}/"]
+                + [str((row * column) % 5000) for column in range(columns)]
+            )
+
+
+def bench_merge(
+    rows: int, columns: int, directory: str, repeat: int = 3
+) -> dict:
+    """Measure load, merge of one snapshot and write of csv history
+
+    Every phase takes the best of `repeat` runs, each on a new file.
+    """
+
+    filename = os.path.join(directory, f"history_{rows}x{columns}.csv")
+    # one snapshot, 5% of items are new
+    total = rows + rows // 20
+    pages = [
+        [
+            [f"/course/{row}/", str(row % 5000)]
+            for row in range(start, min(start + PAGE_SIZE, total))
+        ]
+        for start in range(0, total, PAGE_SIZE)
+    ]
+
+    load = merge = write = math.inf
+    for _ in range(repeat):
+        write_history(filename, rows, columns)
+        start = time.perf_counter()
+        history = CsvHistory(filename)
+        load = min(load, time.perf_counter() - start)
+
+        history.start_snapshot()
+        start = time.perf_counter()
+        for page in pages:
+            history.merge_rows(page)
+        merge = min(merge, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        history.write()
+        write = min(write, time.perf_counter() - start)
+        os.remove(filename)
+
+    prefix = f"merge.{rows}x{columns}"
+    return {
+        f"{prefix}.load_rows_per_s": rows / load,
+        f"{prefix}.merge_rows_per_s": len(history.rows) / merge,
+        f"{prefix}.write_rows_per_s": len(history.rows) / write,
+    }
+
+
+def bench_end_to_end(
+    site: MockSite,
+    workers: int,
+    concurrency: int,
+    directory: str,
+    repeat: int = 3,
+) -> dict:
+    """Measure courses pages per second in sync, threaded and async mode
+
+    Every mode takes the best of `repeat` crawls, each into a new file.
+    """
+
+    base_url, stop = serve_in_thread(site)
+    client.use_base_url(base_url)
+    client.throttle.configure(rate=1e6, burst=1e6, max_concurrency=1e6)
+    url = "https://info-hit.ru/catalog"
+    modes = {
+        "sync": lambda filename: courses.gather_data(url, filename),
+        "threaded": lambda filename: courses.gather_data(
+            url, filename, workers=workers
+        ),
+        "async": lambda filename: asyncio.run(
+            a_courses.gather_data(
+                url, filename, concurrency=concurrency, per_host=concurrency
+            )
+        ),
+    }
+    results = {}
+    try:
+        for mode, run in modes.items():
+            filename = os.path.join(directory, f"e2e_{mode}.csv")
+
+            def crawl() -> None:
+                client.throttle.hosts.clear()
+                run(filename)
+                os.remove(filename)
+
+            requests = site.requests
+            seconds = best_time(crawl, repeat)
+            requests = (site.requests - requests) / repeat
+            results[f"e2e.{mode}.pages_per_s"] = site.catalog_pages / seconds
+            results[f"e2e.{mode}.requests_per_s"] = requests / seconds
+    finally:
+        client.use_base_url(None)
+        stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Get metrics more than `threshold` below baseline
+
+    All metrics are rates, higher is better.
+    """
+
+    regressions = []
+    for metric, value in results.items():
+        base = baseline.get(metric)
+        if base is None or base == 0:
+            continue
+        change = value / base - 1
+        if change < -threshold:
+            regressions.append(
+                f"{metric}: {value:.2f} vs {base:.2f} ({change:+.1%})"
+            )
+    return regressions
+
+
+def main() -> None:
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark parse, merge and end-to-end throughput"
+    )
+    parser.add_argument(
+        "--only",
+        choices=["parse", "merge", "e2e"],
+        action="append",
+        help="run only these benchmarks, may be repeated",
+    )
+    parser.add_argument(
+        "--fixtures", help="zip fixture archive with pages to parse"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs of every measurement, the best one is reported",
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=MERGE_ROWS)
+    parser.add_argument(
+        "--columns", type=int, nargs="+", default=MERGE_COLUMNS
+    )
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="mock site latency, s"
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="write results json to file")
+    parser.add_argument("--baseline", help="results json to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fail when a metric is this share below baseline",
+    )
+    args = parser.parse_args()
+    only = args.only or ["parse", "merge", "e2e"]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        if "parse" in only:
+            pages = synthetic_pages()
+            if args.fixtures:
+                pages = fixture_pages(args.fixtures)
+            results.update(bench_parse(pages, args.repeat))
+        if "merge" in only:
+            for rows in args.rows:
+                for columns in args.columns:
+                    results.update(
+                        bench_merge(rows, columns, directory, args.repeat)
+                    )
+        if "e2e" in only:
+            site = MockSite(
+                latency=args.latency,
+                catalog_pages=args.pages,
+                items_per_page=args.items_per_page,
+            )
+            results.update(
+                bench_end_to_end(
+                    site,
+                    args.workers,
+                    args.concurrency,
+                    directory,
+                    args.repeat,
+                )
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression {regression}", file=sys.stderr)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import json
+
+
+def checkpoint_filename(filename: str) -> str:
+    """Get checkpoint file name of history file"""
+
+    return f"{filename}.checkpoint.json"
+
+
+def replace_file(filename: str, write, mode: str = "w", **kwargs) -> None:
+    """Write file atomically: write temp file, then rename it"""
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, mode, **kwargs) as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def write_checkpoint(filename: str, timestamp: str, progress: dict) -> None:
+    """Save run timestamp and last completed position"""
+
+    checkpoint = {"timestamp": timestamp, "progress": progress}
+    replace_file(
+        checkpoint_filename(filename),
+        lambda file: json.dump(checkpoint, file),
+        encoding="utf-8",
+    )
+
+
+def load_checkpoint(filename: str) -> dict | None:
+    """Get checkpoint of interrupted run or None"""
+
+    try:
+        with open(checkpoint_filename(filename), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def remove_checkpoint(filename: str) -> None:
+    """Remove checkpoint of finished run"""
+
+    try:
+        os.remove(checkpoint_filename(filename))
+    except FileNotFoundError:
+        pass
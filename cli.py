@@ -0,0 +1,166 @@
+import atexit
+import argparse
+
+from client import cache, recorder, throttle, use_base_url, user_agents
+from extract import EXTRACTORS, use_extractor
+from limits import limit, parse_duration
+from metrics import start_metrics_server
+from profiling import add_profile_arguments
+from stats import ProgressReporter, stats
+from storage import STORAGE_MODES, default_filename
+
+
+def build_parser(
+    description: str, url: str | None, filename: str
+) -> argparse.ArgumentParser:
+    """Build argument parser shared by all scrapers"""
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--url", default=url, help="start page url")
+    parser.add_argument(
+        "--output",
+        help=f"history file name (default {filename}, .log.csv for log "
+        "and .sqlite for sqlite storage)",
+    )
+    parser.set_defaults(default_output=filename)
+    parser.add_argument(
+        "--storage",
+        choices=STORAGE_MODES,
+        default="csv",
+        help=(
+            "csv - wide table, log - append-only snapshot log, "
+            "sqlite - SQLite database"
+        ),
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=20,
+        help="write history to disk every N pages",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue interrupted run from its last checkpoint",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="max requests per second to one host",
+    )
+    parser.add_argument(
+        "--burst",
+        type=float,
+        default=20.0,
+        help="max burst of requests to one host",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=float,
+        default=32,
+        help="upper bound of adaptive concurrency per host",
+    )
+    parser.add_argument(
+        "--cache-dir", help="directory of http response cache (off if unset)"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=500,
+        help="max size of cached bodies, MB",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        action="append",
+        default=[],
+        metavar="PATTERN=SECONDS",
+        help="time to live of urls matching regex, may be repeated",
+    )
+    parser.add_argument(
+        "--base-url",
+        help=(
+            "send all requests to this server keeping path and query, "
+            "e.g. mock_site.py"
+        ),
+    )
+    parser.add_argument(
+        "--record",
+        metavar="ARCHIVE",
+        help="record responses into zip fixture archive for mock_site.py",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="FILE",
+        help="write counters and timing histograms to json file at exit",
+    )
+    parser.add_argument(
+        "--progress-every",
+        type=float,
+        default=60,
+        help="print stats line every N seconds (0 - never)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        help="serve Prometheus metrics on this port (0 - off)",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="address of metrics endpoint",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=list(EXTRACTORS),
+        default="lxml",
+        help="html extraction backend",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        help="stop cleanly after N requests, unrefreshed items are marked",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=parse_duration,
+        help="stop cleanly before this run time, e.g. 20m or 1h30m",
+    )
+    parser.add_argument(
+        "--rotate-user-agent",
+        choices=["session", "request"],
+        default="session",
+        help="pick user agent once per session or for every request",
+    )
+    add_profile_arguments(parser)
+    return parser
+
+
+def configure_client(args: argparse.Namespace) -> None:
+    """Apply output, throttle, limit, cache, parser, base url, record, stats"""
+
+    if args.output == None:
+        args.output = default_filename(args.default_output, args.storage)
+    use_extractor(args.parser)
+    use_base_url(args.base_url)
+    user_agents.per_request = args.rotate_user_agent == "request"
+    if args.record:
+        recorder.open(args.record)
+    if args.stats:
+        atexit.register(stats.save, args.stats)
+    if args.progress_every > 0:
+        ProgressReporter(args.progress_every).start()
+    if args.metrics_port > 0:
+        start_metrics_server(args.metrics_port, args.metrics_host)
+
+    throttle.configure(
+        rate=args.rate, burst=args.burst, max_concurrency=args.max_concurrency
+    )
+    limit.configure(args.max_requests, args.deadline)
+    if args.cache_dir:
+        ttls = []
+        for option in args.cache_ttl:
+            pattern, _, seconds = option.rpartition("=")
+            ttls.append((pattern, float(seconds)))
+        cache.open(args.cache_dir, args.cache_size * 1024 * 1024, ttls)
@@ -0,0 +1,442 @@
+import time
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import Retry
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from extract import WeeklyViewsScanner
+from fixtures import FixtureRecorder
+from http_cache import CacheEntry, ResponseCache
+from limits import limit
+from stats import stats
+from throttle import Throttle, RETRY_STATUSES, retry_delay
+from useragents import UserAgentRotation
+
+if TYPE_CHECKING:
+    # imported where used, it takes long to import for sync scrapers
+    import aiohttp
+
+STATUS_RETRIES = 3
+STREAM_CHUNK = 16 * 1024
+
+throttle = Throttle()
+cache = ResponseCache()
+recorder = FixtureRecorder()
+# user agent of every requests adapter and aiohttp session
+user_agents = UserAgentRotation()
+# scheme and host all requests are sent to (mock site), None - as is
+base_url: str | None = None
+
+requests.packages.urllib3.disable_warnings(
+    requests.packages.urllib3.exceptions.InsecureRequestWarning
+)
+
+
+def use_base_url(url: str | None) -> None:
+    """Send all requests to `url` keeping their path and query"""
+
+    global base_url
+    base_url = url
+
+
+def rebase(url: str, headers) -> str:
+    """Get url moved to base url, original host goes to X-Forwarded-Host"""
+
+    if base_url == None:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(base_url)
+    headers["X-Forwarded-Host"] = parts.netloc
+    return urlunsplit(
+        (base.scheme, base.netloc, parts.path, parts.query, parts.fragment)
+    )
+
+
+def cached_response(request, entry: CacheEntry) -> requests.Response | None:
+    """Build response from cache entry"""
+
+    body = cache.read(entry)
+    if body is None:
+        return None
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict()
+    if entry.content_type:
+        response.headers["Content-Type"] = entry.content_type
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Connection timing DNS lookup and connect into http.connect"""
+
+    def connect(self) -> None:
+        with stats.timer("http.connect"):
+            super().connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """Connection timing DNS lookup, connect and TLS into http.connect"""
+
+    def connect(self) -> None:
+        with stats.timer("http.connect"):
+            super().connect()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class RequestAttempts:
+    """Attempts of one request, retried on 429 and 5xx
+
+    Every attempt takes one request of the run limit and a concurrency
+    slot of the host throttle, is counted in stats and its response or
+    error is reported back to the throttle.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.netloc = urlsplit(url).netloc
+        self.host = throttle.host(url)
+        self.attempt = 0
+        self.start = 0.0
+
+    def started(self) -> None:
+        """Count attempt sent once its slot is taken"""
+
+        stats.count("http.requests", host=self.netloc)
+        if self.attempt > 0:
+            stats.count("http.retries", host=self.netloc)
+        self.start = time.monotonic()
+
+    def failed(self) -> None:
+        """Report attempt ended with connection error"""
+
+        stats.count("http.errors", host=self.netloc)
+        self.host.release(None, time.monotonic() - self.start)
+
+    def answered(self, status: int) -> bool:
+        """Report response headers, check if request is to be retried"""
+
+        latency = time.monotonic() - self.start
+        stats.observe("http.ttfb", latency)
+        if status >= 400:
+            stats.count("http.failed", host=self.netloc)
+        self.host.release(status, latency)
+        return status in RETRY_STATUSES and self.attempt < STATUS_RETRIES
+
+    def next_delay(self, retry_after: str | None) -> float:
+        """Get delay before next attempt"""
+
+        delay = retry_delay(self.attempt, retry_after)
+        self.attempt += 1
+        return delay
+
+
+def send_with_retries(
+    url: str, send: Callable[[], requests.Response]
+) -> requests.Response:
+    """Send request by `send` until it is not throttled, body is not read"""
+
+    attempts = RequestAttempts(url)
+    while True:
+        limit.check()
+        attempts.host.acquire()
+        attempts.started()
+        try:
+            response = send()
+        except Exception:
+            attempts.failed()
+            raise
+        if not attempts.answered(response.status_code):
+            return response
+        delay = attempts.next_delay(response.headers.get("Retry-After"))
+        response.close()
+        time.sleep(delay)
+
+
+async def send_with_retries_async(
+    url: str, send: Callable[[], Awaitable["aiohttp.ClientResponse"]]
+) -> "aiohttp.ClientResponse":
+    """Send request by `send` until it is not throttled, body is not read
+
+    The caller releases the response.
+    """
+
+    attempts = RequestAttempts(url)
+    while True:
+        limit.check()
+        await attempts.host.acquire_async()
+        attempts.started()
+        try:
+            response = await send()
+        except Exception:
+            attempts.failed()
+            raise
+        if not attempts.answered(response.status):
+            return response
+        delay = attempts.next_delay(response.headers.get("Retry-After"))
+        response.release()
+        await asyncio.sleep(delay)
+
+
+class UserAgentAdapter(HTTPAdapter):
+    """HTTPAdapter that only sends user agent of the shared rotation"""
+
+    def send(self, request, **kwargs) -> requests.Response:
+        request.headers["User-Agent"] = user_agents.user_agent(self)
+        return super().send(request, **kwargs)
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """HTTPAdapter that waits for host throttle and retries 429/5xx
+
+    GET requests go through the shared response cache when it is open:
+    fresh entries are returned without a request, stale ones are
+    revalidated. Streamed requests bypass the cache. When the recorder
+    is open, responses of not streamed requests are recorded under their
+    original url.
+    """
+
+    def __init__(self, throttle: Throttle, **kwargs) -> None:
+        self.throttle = throttle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs) -> requests.Response:
+        url = request.url
+        request.headers["User-Agent"] = user_agents.user_agent(self)
+        request.url = rebase(url, request.headers)
+        response = self.send_cached(request, **kwargs)
+        if recorder.enabled and not kwargs.get("stream"):
+            recorder.record(
+                url,
+                response.status_code,
+                response.headers.get("Content-Type"),
+                response.content,
+            )
+        return response
+
+    def send_cached(self, request, **kwargs) -> requests.Response:
+        if (
+            not cache.enabled
+            or request.method != "GET"
+            or kwargs.get("stream")
+        ):
+            return self.send_throttled(request, **kwargs)
+
+        entry = cache.get(request.url)
+        if entry is not None and entry.fresh:
+            response = cached_response(request, entry)
+            if response is not None:
+                stats.count("cache.hit")
+                return response
+        if entry is not None:
+            request.headers.update(entry.validators())
+
+        response = self.send_throttled(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            cached = cached_response(request, entry)
+            if cached is not None:
+                cache.touch(entry)
+                stats.count("cache.revalidated")
+                return cached
+            # cached body is lost, refetch without validators
+            for header in entry.validators():
+                del request.headers[header]
+            response = self.send_throttled(request, **kwargs)
+        stats.count("cache.miss")
+        if response.status_code == 200:
+            cache.store(request.url, response.headers, response.content)
+        return response
+
+    def send_throttled(self, request, **kwargs) -> requests.Response:
+        send = super().send
+        response = send_with_retries(
+            request.url, lambda: send(request, **kwargs)
+        )
+        if not kwargs.get("stream"):
+            with stats.timer("http.body"):
+                stats.count("http.bytes", len(response.content))
+        return response
+
+
+def mount_adapter(session: requests.Session, pool_size: int = 10) -> None:
+    """Mount throttled adapter keeping `pool_size` connections per host"""
+
+    retry = Retry(connect=3, backoff_factor=0.5)
+    adapter = ThrottledAdapter(
+        throttle,
+        max_retries=retry,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Create session throttled by shared per-host throttle"""
+
+    session = requests.Session()
+    mount_adapter(session, pool_size)
+    return session
+
+
+def stream_page(
+    session: requests.Session,
+    url: str,
+    headers: dict,
+    scanner: WeeklyViewsScanner,
+) -> str | None:
+    """Feed page to scanner while it is downloaded
+
+    Returns None when the scanner found its value, the connection is
+    closed then without reading the rest of the page. Otherwise returns
+    the whole page text.
+    """
+
+    with session.get(
+        url=url, headers=headers, verify=False, stream=True
+    ) as response:
+        with stats.timer("http.body"):
+            for chunk in response.iter_content(STREAM_CHUNK):
+                stats.count("http.bytes", len(chunk))
+                if scanner.feed(chunk):
+                    return None
+        return scanner.text(response.encoding)
+
+
+async def fetch_text(
+    session: "aiohttp.ClientSession", url: str, headers: dict
+) -> str:
+    """Get page text through shared response cache and per-host throttle"""
+
+    original_url = url
+    headers = dict(headers)
+    headers["User-Agent"] = user_agents.user_agent(session)
+    url = rebase(url, headers)
+
+    entry = cache.get(url) if cache.enabled else None
+    if entry is not None:
+        cached_body = cache.read(entry)
+        if cached_body is None:
+            entry = None
+        else:
+            cached_text = cached_body.decode(
+                entry.charset() or "utf-8", "replace"
+            )
+            if entry.fresh:
+                stats.count("cache.hit")
+                if recorder.enabled:
+                    recorder.record(
+                        original_url, 200, entry.content_type, cached_body
+                    )
+                return cached_text
+            headers = {**headers, **entry.validators()}
+
+    response = await send_with_retries_async(
+        url, lambda: session.get(url=url, headers=headers)
+    )
+    try:
+        with stats.timer("http.body"):
+            body = await response.read()
+            text = await response.text()
+    finally:
+        response.release()
+    stats.count("http.bytes", len(body))
+
+    if response.status == 304 and entry is not None:
+        cache.touch(entry)
+        stats.count("cache.revalidated")
+        if recorder.enabled:
+            recorder.record(original_url, 200, entry.content_type, cached_body)
+        return cached_text
+    if cache.enabled:
+        stats.count("cache.miss")
+        if response.status == 200:
+            cache.store(url, response.headers, body)
+    if recorder.enabled:
+        recorder.record(
+            original_url,
+            response.status,
+            response.headers.get("Content-Type"),
+            body,
+        )
+    return text
+
+
+async def stream_page_async(
+    session: "aiohttp.ClientSession",
+    url: str,
+    headers: dict,
+    scanner: WeeklyViewsScanner,
+) -> str | None:
+    """Feed page to scanner while it is downloaded, see `stream_page`"""
+
+    headers = dict(headers)
+    headers["User-Agent"] = user_agents.user_agent(session)
+    url = rebase(url, headers)
+    response = await send_with_retries_async(
+        url, lambda: session.get(url=url, headers=headers)
+    )
+    try:
+        with stats.timer("http.body"):
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK):
+                stats.count("http.bytes", len(chunk))
+                if scanner.feed(chunk):
+                    # drop connection instead of reading the rest
+                    response.close()
+                    return None
+        return scanner.text(response.charset)
+    finally:
+        response.release()
+
+
+def trace_config() -> "aiohttp.TraceConfig":
+    """Get aiohttp trace config timing DNS lookup and connect into stats
+
+    http.connect includes DNS lookup and TLS, as for requests sessions.
+    """
+
+    async def on_dns_start(session, context, params) -> None:
+        context.dns_start = time.monotonic()
+
+    async def on_dns_end(session, context, params) -> None:
+        stats.observe("http.dns", time.monotonic() - context.dns_start)
+
+    async def on_connect_start(session, context, params) -> None:
+        context.connect_start = time.monotonic()
+
+    async def on_connect_end(session, context, params) -> None:
+        stats.observe("http.connect", time.monotonic() - context.connect_start)
+
+    import aiohttp
+
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(on_dns_start)
+    config.on_dns_resolvehost_end.append(on_dns_end)
+    config.on_connection_create_start.append(on_connect_start)
+    config.on_connection_create_end.append(on_connect_end)
+    return config
@@ -1,201 +1,401 @@
-import os
-import requests
-from requests.adapters import HTTPAdapter
-from bs4 import BeautifulSoup
-from anti_useragent import UserAgent
-import csv
-import datetime
-import re
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
-from urllib3 import Retry
+from cli import build_parser, configure_client
+from client import create_session, mount_adapter, stream_page
+from extract import WeeklyViewsScanner, extractor
+from limits import LimitReached, limit
+from pipeline import Pipeline, add_pipeline_arguments
+from profiling import profile_run
+from refresh import (
+    RefreshState,
+    add_refresh_arguments,
+    merge_pages,
+    plan_pages,
+)
+from stats import stats
+from storage import History, open_history, run
 
-ua = UserAgent()
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
-session = requests.Session()
-retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-requests.packages.urllib3.disable_warnings(
-    requests.packages.urllib3.exceptions.InsecureRequestWarning
-)
-
+session = create_session()
 
-def get_pages_count(home_url: str) -> int:
-    """Get pages count"""
 
-    response = session.get(url=home_url, headers=headers, verify=False)
+def parse_pages_count(html: str) -> int:
+    """Get pages count from catalog page"""
 
-    soup = BeautifulSoup(response.text, "lxml")
+    with stats.timer("parse.catalog"):
+        return extractor().pages_count(html)
 
-    navigation_panel = soup.find("div", class_="navigation")
-    navigation_titles = navigation_panel.find_all("a")
-    return int(navigation_titles[-2].text)
 
+def parse_items_urls(html: str) -> list[str]:
+    """Get course pages urls from catalog page"""
 
-def get_headers(filename: str) -> list[str]:
-    """Get csv file header row"""
+    with stats.timer("parse.catalog"):
+        return extractor().items_urls(html)
 
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        return next(reader)
 
+def parse_weekly_views(html: str) -> str | None:
+    """Get weekly views from course page or None"""
 
-def add_headers(filename: str, headers: list[str]) -> None:
-    """Add headers to csv file"""
+    with stats.timer("parse.course"):
+        return extractor().weekly_views(html)
 
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(headers)
 
+def get_first_page(url: str) -> tuple[str, int]:
+    """Get first catalog page and pages count read from it"""
 
-def get_csv(filename: str) -> list[list[str]]:
-    """Get all data from csv"""
-
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        csv_data = [item for item in reader]
-        return csv_data
+    response = session.get(
+        url=f"{url}/?PAGEN_1=1", headers=headers, verify=False
+    )
+    return response.text, parse_pages_count(response.text)
 
 
-def create_csv(filename: str, data: list[str]) -> None:
-    """Create csv file with data"""
+def get_weekly_views(url_item: str, stream: bool = False) -> str | None:
+    """Get weekly views of course page
 
-    header = ["", datetime.datetime.now()]
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data:
-            writer.writerow(item)
+    With `stream` the page is read only up to the rating, the rest of it
+    is parsed only when the rating is not found by the fast pattern.
+    """
 
+    if not stream:
+        response_item = session.get(
+            url=url_item, headers=headers, verify=False
+        )
+        return parse_weekly_views(response_item.text)
 
-def add_to_csv(filename: str, data: list[str]) -> None:
-    """Add data to csv file"""
+    scanner = WeeklyViewsScanner()
+    html = stream_page(session, url_item, headers, scanner)
+    if html == None:
+        stats.count("stream.stopped_early")
+        return scanner.value
+    return parse_weekly_views(html)
 
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        for item in data:
-            writer.writerow(item)
 
+def has_details(item_url: str) -> bool:
+    """Check if catalog item links to a course page"""
 
-def new_iteration_csv(filename: str, data: list[str]) -> None:
-    """Add new headers to csv at new parser iteration"""
+    return "away.php" not in item_url
 
-    header = get_headers(filename)
-    header.append(str(datetime.datetime.now()))
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data[1:]:
-            writer.writerow(item)
 
+def get_item_data(
+    item_url: str,
+    refresh: RefreshState | None = None,
+    stream: bool = False,
+) -> list[str] | None:
+    """Get item data or None, fresh items are taken from refresh state"""
 
-def data_to_csv(
-    filename: str, data: list[str], first_dataframe: bool = False
-) -> None:
-    """Add data to csv file or create it"""
+    if not has_details(item_url):
+        stats.count("skip.away")
+        return None
 
-    if not os.path.exists(filename):
-        create_csv(filename, data)
+    if refresh != None and not refresh.is_stale(item_url):
+        stats.count("skip.fresh")
+        weekly_views = refresh.last_value(item_url)
     else:
-        if first_dataframe == True:
-            new_iteration_csv(filename, get_csv(filename))
-
-        csv_data = get_csv(filename)
-
-        headers_len = len(get_headers(filename))
-        for data_item in data:
-            for i, csv_item in enumerate(csv_data):
-                if data_item[0] == csv_item[0]:
-                    if len(csv_item) == headers_len - 1:
-                        csv_data[i].append(data_item[1])
-                    break
-            else:
-                if headers_len == len(data_item):
-                    csv_data.append(data_item)
-                elif headers_len > len(data_item):
-                    csv_data.append(
-                        [
-                            data_item[0],
-                            *[""] * (headers_len - len(data_item)),
-                            data_item[1],
-                        ]
-                    )
-        add_to_csv(filename, csv_data)
-
-
-def get_item_data(item, item_url: str) -> list[str] | None:
-    """Get item data or None"""
-
-    if item_url == None:
-        item_url = item.find("a", class_="course-card__wrap")
-    item_url = item_url.get("href")
-    if "away.php" in item_url:
+        weekly_views = get_weekly_views(
+            f"https://info-hit.ru{item_url}", stream
+        )
+        if refresh != None:
+            refresh.update(item_url, weekly_views)
+
+    if weekly_views == None:
+        stats.count("skip.no_rating")
         return None
 
-    response_item = session.get(
-        url=f"https://info-hit.ru{item_url}", headers=headers, verify=False
-    )
-
-    soup = BeautifulSoup(response_item.text, "lxml")
+    return [item_url, weekly_views]
 
-    try:
-        weekly_views = re.search(
-            r"\d+",
-            soup.find("span", class_="cp-hero__rating-text").text,
-        ).group()
-    except Exception as e:
-        return None
 
-    return [item_url, weekly_views]
+def get_items_data(
+    html: str,
+    refresh: RefreshState | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    stream: bool = False,
+) -> list[list[str]]:
+    """Get data of all items of catalog page html"""
 
+    return get_urls_data(parse_items_urls(html), refresh, executor, stream)
 
-def get_page_data(url_page: str) -> list[list[str]]:
-    """Get data of all items on page"""
 
-    response_page = session.get(url=url_page, headers=headers, verify=False)
-    soup = BeautifulSoup(response_page.text, "lxml")
+def get_urls_data(
+    items_urls: list[str],
+    refresh: RefreshState | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    stream: bool = False,
+) -> list[list[str]]:
+    """Get data of course pages of catalog page"""
 
-    items = soup.find_all("div", class_="catalog__item")
-    if len(items) == 0:
-        items = soup.find_all("div", class_="courses-cards__list__item")
+    stats.add_gauge("queue.items", len(items_urls))
+    if executor != None:
+        items_data = executor.map(
+            lambda item_url: get_item_data(item_url, refresh, stream),
+            items_urls,
+        )
+    else:
+        items_data = (
+            get_item_data(item_url, refresh, stream)
+            for item_url in items_urls
+        )
 
     page_items = []
-    i = 0
-    for item in items:
-        item_url = item.find("a", class_="catalog__item__link")
-        item_data = get_item_data(item, item_url)
+    for item_data in items_data:
+        stats.add_gauge("queue.items", -1)
         if item_data != None:
             page_items.append(item_data)
-        i += 1
 
     return page_items
 
 
-def gather_data(url: str, csv_filename: str) -> None:
-    """Gather all data"""
+def get_page(url_page: str) -> str:
+    """Get catalog page text"""
 
-    pages = get_pages_count(url)
+    response_page = session.get(url=url_page, headers=headers, verify=False)
+    return response_page.text
 
-    is_first_page = True
-    for page in tqdm(range(1, pages + 1)):
-        url_page = f"{url}/?PAGEN_1={page}"
-        page_data = get_page_data(url_page)
-        if len(page_data) > 0:
-            data_to_csv(csv_filename, page_data, is_first_page)
-        is_first_page = False
+
+def get_page_data(
+    url_page: str,
+    refresh: RefreshState | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    stream: bool = False,
+) -> list[list[str]]:
+    """Get data of all items on page"""
+
+    return get_items_data(get_page(url_page), refresh, executor, stream)
+
+
+def gather_pipelined(
+    url: str,
+    first_page: str,
+    pages: range,
+    history: History,
+    refresh: RefreshState | None,
+    executor: ThreadPoolExecutor | None,
+    stream: bool,
+    fetch_workers: int,
+    parse_workers: int,
+    queue_size: int,
+) -> None:
+    """Fetch catalog pages, parse them and get their courses in stages
+
+    Course pages of up to `fetch_workers` catalog pages are fetched and
+    parsed at once, sharing `executor` when given. Pages are merged in
+    order by this thread while the next ones are fetched.
+    """
+
+    def fetch(page: int, _) -> str:
+        if page == 1:
+            return first_page
+        return get_page(f"{url}/?PAGEN_1={page}")
+
+    pipeline = Pipeline(
+        [
+            ("fetch", fetch, fetch_workers),
+            (
+                "parse",
+                lambda page, html: parse_items_urls(html),
+                parse_workers,
+            ),
+            (
+                "details",
+                lambda page, items_urls: get_urls_data(
+                    items_urls, refresh, executor, stream
+                ),
+                fetch_workers,
+            ),
+        ],
+        queue_size,
+    )
+    with tqdm(total=len(pages)) as bar:
+
+        def write(page: int, page_data: list[list[str]]) -> None:
+            history.merge(page_data, progress={"page": page})
+            bar.update()
+
+        pipeline.run(pages, write)
+
+
+def gather_prioritized(
+    url: str,
+    first_page: str,
+    pages: range,
+    history: History,
+    refresh: RefreshState | None,
+    executor: ThreadPoolExecutor | None,
+    stream: bool,
+) -> None:
+    """Read catalog pages, fetch course pages by priority, merge catalog
+
+    Catalog pages are cheap and give all course urls, so they are read
+    first. Then course pages planned by `refresh` (all without it) are
+    fetched, highest priority first, and catalog pages are merged with
+    values fetched in this run or carried forward. When the run limit is
+    reached only read catalog pages are merged, their courses left are
+    marked as not refreshed.
+    """
+
+    def get_page_urls(page: int) -> list[str]:
+        if page == 1:
+            return parse_items_urls(first_page)
+        return parse_items_urls(get_page(f"{url}/?PAGEN_1={page}"))
+
+    def get_planned_data(item_url: str) -> list[str] | None:
+        try:
+            return get_item_data(item_url, refresh, stream)
+        except LimitReached:
+            # left out, its row is marked when the run is finished
+            stats.count("skip.limit")
+            return None
+
+    map_items = map if executor == None else executor.map
+
+    pages_urls = []
+    try:
+        for items_urls in map_items(get_page_urls, pages):
+            pages_urls.append(items_urls)
+    except LimitReached:
+        pass
+
+    planned = plan_pages(pages_urls, refresh, has_details)
+    items_data = dict(zip(planned, map_items(get_planned_data, planned)))
+    merge_pages(
+        history,
+        pages,
+        pages_urls,
+        items_data,
+        lambda item_url: get_item_data(item_url, refresh),
+    )
+
+
+def gather_data(
+    url: str,
+    csv_filename: str,
+    checkpoint_every: int = 20,
+    storage: str = "csv",
+    resume: bool = False,
+    refresh: RefreshState | None = None,
+    workers: int = 1,
+    stream: bool = False,
+    fetch_workers: int = 0,
+    parse_workers: int = 1,
+    queue_size: int = 8,
+) -> None:
+    """Gather all data
+
+    With `refresh` only stale course pages are fetched. With its budget
+    or a run limit all catalog pages are read first to fetch course pages
+    by priority, items not refreshed before the limit are marked in the
+    snapshot and the run is finished. With `workers`
+    more than 1 course pages of each catalog page are fetched by a thread
+    pool, connection pool of the session is sized to match. With `stream`
+    course pages are downloaded only up to the rating. With
+    `fetch_workers` pages go through the staged pipeline.
+    """
+
+    executor = None
+    if workers > 1:
+        executor = ThreadPoolExecutor(workers)
+    if workers > 1 or fetch_workers > 0:
+        # catalog and course pages of every fetch worker
+        mount_adapter(session, max(workers, 1) + 2 * fetch_workers)
+
+    first_page, pages = get_first_page(url)
+
+    history = open_history(
+        storage, csv_filename, checkpoint_every=checkpoint_every
+    )
+    with run(history, resume) as progress:
+        if refresh != None:
+            refresh.start_run(history.timestamp)
+        pages_range = range(progress.get("page", 0) + 1, pages + 1)
+        try:
+            if limit.active or (refresh != None and refresh.budget != None):
+                gather_prioritized(
+                    url,
+                    first_page,
+                    pages_range,
+                    history,
+                    refresh,
+                    executor,
+                    stream,
+                )
+            elif fetch_workers > 0:
+                gather_pipelined(
+                    url,
+                    first_page,
+                    pages_range,
+                    history,
+                    refresh,
+                    executor,
+                    stream,
+                    fetch_workers,
+                    parse_workers,
+                    queue_size,
+                )
+            else:
+                for page in tqdm(pages_range):
+                    if page == 1:
+                        page_data = get_items_data(
+                            first_page, refresh, executor, stream
+                        )
+                    else:
+                        url_page = f"{url}/?PAGEN_1={page}"
+                        page_data = get_page_data(
+                            url_page, refresh, executor, stream
+                        )
+                    history.merge(page_data, progress={"page": page})
+        finally:
+            if executor != None:
+                executor.shutdown(cancel_futures=True)
+            if refresh != None:
+                refresh.save()
 
 
 def main() -> None:
     """Main function"""
 
-    gather_data(
-        url="https://info-hit.ru/catalog", csv_filename="E:/courses.csv"
+    parser = build_parser(
+        "Gather courses weekly views",
+        url="https://info-hit.ru/catalog",
+        filename="E:/courses.csv",
+    )
+    add_refresh_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="threads fetching course pages",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stop downloading course pages once the rating is read",
     )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    configure_client(args)
+
+    refresh = None
+    if args.incremental or args.budget != None:
+        refresh = RefreshState(
+            args.output, args.hot_views, args.cold_every, args.budget
+        )
+
+    with profile_run(args):
+        gather_data(
+            url=args.url,
+            csv_filename=args.output,
+            checkpoint_every=args.checkpoint_every,
+            storage=args.storage,
+            resume=args.resume,
+            refresh=refresh,
+            workers=args.workers,
+            stream=args.stream,
+            fetch_workers=args.fetch_workers,
+            parse_workers=args.parse_workers,
+            queue_size=args.queue_size,
+        )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,6 @@
 import os
 import requests
-from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 import csv
 import datetime
 import re
@@ -11,14 +9,16 @@ from tqdm import tqdm
 
 from urllib3 import Retry
 
-ua = UserAgent()
+from client import UserAgentAdapter
+from stats import stats
+
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
 session = requests.Session()
 retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
+# user agent is taken from the pool on the first request
+adapter = UserAgentAdapter(max_retries=retry)
 session.mount("http://", adapter)
 session.mount("https://", adapter)
 requests.packages.urllib3.disable_warnings(
@@ -136,6 +136,7 @@ def get_item_data(item, item_url: str) -> list[str] | None:
         item_url = item.find("a", class_="course-card__wrap")
     item_url = item_url.get("href")
     if "away.php" in item_url:
+        stats.count("skip.away")
         return None
 
     response_item = session.get(
@@ -150,6 +151,7 @@ def get_item_data(item, item_url: str) -> list[str] | None:
             soup.find("span", class_="cp-hero__rating-text").text,
         ).group()
     except Exception as e:
+        stats.count("skip.no_rating")
         return None
 
     return [item_url, weekly_views]
@@ -166,16 +168,12 @@ def get_page_data(url_page: str) -> list[list[str]]:
         items = soup.find_all("div", class_="courses-cards__list__item")
 
     page_items = []
-    i = 0
     for item in items:
-        logging.info(f"Item {i+1}/{len(items)}")
         item_url = item.find("a", class_="catalog__item__link")
         item_data = get_item_data(item, item_url)
+        stats.count("items")
         if item_data != None:
             page_items.append(item_data)
-        else:
-            logging.info(f"Item {i+1} skipped")
-        i += 1
 
     return page_items
 
@@ -191,7 +189,8 @@ def gather_data(url: str) -> None:
         url_page = f"{url}/?PAGEN_1={page}"
         page_data = get_page_data(url_page)
         if len(page_data) > 0:
-            data_to_csv("csv/courses.csv", page_data, is_first_page)
+            with stats.timer("history.merge"):
+                data_to_csv("csv/courses.csv", page_data, is_first_page)
         is_first_page = False
 
 
@@ -202,6 +201,7 @@ def main() -> None:
     gather_data(url="https://info-hit.ru/catalog")
     end_time = datetime.datetime.now()
     print("Duration: {}".format(end_time - start_time))
+    print(stats.progress_line())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,350 @@
+import re
+
+import lxml.html
+from lxml import etree
+from bs4 import BeautifulSoup
+
+from stats import stats
+
+
+def has_class(name: str) -> str:
+    """Get XPath condition of element having class"""
+
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def class_is(value: str) -> str:
+    """Get XPath condition of element having exactly these classes"""
+
+    return f"normalize-space(@class) = '{value}'"
+
+
+class SoupExtractor:
+    """Extraction with full-tree BeautifulSoup parsing"""
+
+    def pages_count(self, html: str) -> int:
+        """Get pages count from catalog or authors page"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        navigation_panel = soup.find("div", class_="navigation")
+        navigation_titles = navigation_panel.find_all("a")
+        return int(navigation_titles[-2].text)
+
+    def items_urls(self, html: str) -> list[str]:
+        """Get course pages urls from catalog page"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        items = soup.find_all("div", class_="catalog__item")
+        if len(items) == 0:
+            items = soup.find_all("div", class_="courses-cards__list__item")
+
+        items_urls = []
+        for item in items:
+            item_url = item.find("a", class_="catalog__item__link")
+            if item_url == None:
+                item_url = item.find("a", class_="course-card__wrap")
+            items_urls.append(item_url.get("href"))
+        return items_urls
+
+    def weekly_views(self, html: str) -> str | None:
+        """Get weekly views from course page or None"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        try:
+            return re.search(
+                r"\d+",
+                soup.find("span", class_="cp-hero__rating-text").text,
+            ).group()
+        except Exception as e:
+            return None
+
+    def authors(self, html: str) -> list[list[str]]:
+        """Get name, views and reviews of all authors of authors page"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        page_items = []
+        for item in soup.find_all("div", class_="author-item_wrap"):
+            item_name = item.find("div", class_="author-item-name").text
+            item_li = (
+                item.find("div", class_="author-item-stat")
+                .find("ul")
+                .find_all("li")[:2]
+            )
+            try:
+                item_views = item_li[0].find("span").text
+            except:
+                item_views = 0
+            try:
+                item_revs = item_li[1].find("span").text
+            except:
+                item_revs = 0
+            page_items.append([item_name, item_views, item_revs])
+        return page_items
+
+    def scladchins_urls(self, html: str) -> list[str]:
+        """Get all scladchins urls from forum main page"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        scladchins_all = soup.find(
+            "li", class_="node category level_1 node_46"
+        )
+        scladchins_ol = scladchins_all.find("ol", class_="nodeList")
+        scladchins_li = scladchins_ol.find_all("li")
+
+        scladchins_urls = []
+        for li in scladchins_li:
+            li_title = li.find("h3", class_="nodeTitle")
+            scladchina_href = li_title.find("a").get("href")
+            scladchins_urls.append(scladchina_href)
+        return scladchins_urls
+
+    def threads_pages_count(self, html: str) -> int:
+        """Get threads pages count from threads page"""
+
+        soup = BeautifulSoup(html, "lxml")
+        try:
+            navigation_panel = soup.find("div", class_="PageNav").find("nav")
+            navigation_titles = navigation_panel.find_all("a")
+        except:
+            return 1
+        return int(navigation_titles[-2].text)
+
+    def threads(self, html: str) -> list[list[str]]:
+        """Get url, scladniks and views of not sticky threads"""
+
+        soup = BeautifulSoup(html, "lxml")
+
+        scladchina_threads = []
+        for item in soup.find_all("li", class_="discussionListItem"):
+            if item.find(class_="sticky"):
+                stats.count("skip.sticky")
+                continue
+            thread_data_name = item.find("a").get("href")
+            thread_data_row = item.find(
+                "div", class_="listBlock stats pairsJustified"
+            )
+            try:
+                thread_data_scladniks = (
+                    thread_data_row.find("dl", class_="major").find("dd").text
+                )
+            except:
+                thread_data_scladniks = 0
+            try:
+                thread_data_views = (
+                    thread_data_row.find("dl", class_="minor").find("dd").text
+                )
+            except:
+                thread_data_views = 0
+            scladchina_threads.append(
+                [thread_data_name, thread_data_scladniks, thread_data_views]
+            )
+        return scladchina_threads
+
+
+NAVIGATION_LINKS = etree.XPath(
+    f"(//div[{has_class('navigation')}])[1]//a"
+)
+CATALOG_ITEMS = etree.XPath(f"//div[{has_class('catalog__item')}]")
+CARDS_ITEMS = etree.XPath(f"//div[{has_class('courses-cards__list__item')}]")
+ITEM_LINK = etree.XPath(f".//a[{has_class('catalog__item__link')}]/@href")
+CARD_LINK = etree.XPath(f".//a[{has_class('course-card__wrap')}]/@href")
+RATING = etree.XPath(f"(//span[{has_class('cp-hero__rating-text')}])[1]")
+AUTHORS = etree.XPath(f"//div[{has_class('author-item_wrap')}]")
+AUTHOR_NAME = etree.XPath(f"(.//div[{has_class('author-item-name')}])[1]")
+AUTHOR_STATS = etree.XPath(
+    f"((.//div[{has_class('author-item-stat')}])[1]//ul)[1]//li"
+)
+FIRST_SPAN = etree.XPath("(.//span)[1]")
+SCLADCHINS_LIST = etree.XPath(
+    f"((//li[{class_is('node category level_1 node_46')}])[1]"
+    f"//ol[{has_class('nodeList')}])[1]//li"
+)
+NODE_LINK = etree.XPath(f"((.//h3[{has_class('nodeTitle')}])[1]//a)[1]")
+PAGE_NAV_LINKS = etree.XPath(
+    f"((//div[{has_class('PageNav')}])[1]//nav)[1]//a"
+)
+THREADS = etree.XPath(f"//li[{has_class('discussionListItem')}]")
+STICKY = etree.XPath(f".//*[{has_class('sticky')}]")
+FIRST_LINK = etree.XPath("(.//a)[1]")
+THREAD_STATS = etree.XPath(
+    f"(.//div[{class_is('listBlock stats pairsJustified')}])[1]"
+)
+MAJOR = etree.XPath(f"((.//dl[{has_class('major')}])[1]//dd)[1]")
+MINOR = etree.XPath(f"((.//dl[{has_class('minor')}])[1]//dd)[1]")
+
+
+def document(html: str):
+    """Parse html with lxml"""
+
+    if html.strip() == "":
+        html = "<html></html>"
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str with xml encoding declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def first_text(xpath: etree.XPath, element, default=0):
+    """Get text of first element matched by xpath or default"""
+
+    found = xpath(element)
+    if len(found) == 0:
+        return default
+    return found[0].text_content()
+
+
+class LxmlExtractor:
+    """Extraction with precompiled XPath on lxml tree
+
+    Gives the same results as SoupExtractor several times faster.
+    """
+
+    def pages_count(self, html: str) -> int:
+        """Get pages count from catalog or authors page"""
+
+        return int(NAVIGATION_LINKS(document(html))[-2].text_content())
+
+    def items_urls(self, html: str) -> list[str]:
+        """Get course pages urls from catalog page"""
+
+        root = document(html)
+
+        items = CATALOG_ITEMS(root)
+        if len(items) == 0:
+            items = CARDS_ITEMS(root)
+
+        items_urls = []
+        for item in items:
+            item_url = ITEM_LINK(item) or CARD_LINK(item)
+            items_urls.append(str(item_url[0]))
+        return items_urls
+
+    def weekly_views(self, html: str) -> str | None:
+        """Get weekly views from course page or None"""
+
+        rating = RATING(document(html))
+        if len(rating) == 0:
+            return None
+        weekly_views = re.search(r"\d+", rating[0].text_content())
+        if weekly_views == None:
+            return None
+        return weekly_views.group()
+
+    def authors(self, html: str) -> list[list[str]]:
+        """Get name, views and reviews of all authors of authors page"""
+
+        page_items = []
+        for item in AUTHORS(document(html)):
+            item_name = AUTHOR_NAME(item)[0].text_content()
+            item_li = AUTHOR_STATS(item)[:2]
+            item_views = 0
+            if len(item_li) > 0:
+                item_views = first_text(FIRST_SPAN, item_li[0])
+            item_revs = 0
+            if len(item_li) > 1:
+                item_revs = first_text(FIRST_SPAN, item_li[1])
+            page_items.append([item_name, item_views, item_revs])
+        return page_items
+
+    def scladchins_urls(self, html: str) -> list[str]:
+        """Get all scladchins urls from forum main page"""
+
+        return [
+            NODE_LINK(li)[0].get("href")
+            for li in SCLADCHINS_LIST(document(html))
+        ]
+
+    def threads_pages_count(self, html: str) -> int:
+        """Get threads pages count from threads page"""
+
+        navigation_titles = PAGE_NAV_LINKS(document(html))
+        if len(navigation_titles) == 0:
+            return 1
+        return int(navigation_titles[-2].text_content())
+
+    def threads(self, html: str) -> list[list[str]]:
+        """Get url, scladniks and views of not sticky threads"""
+
+        scladchina_threads = []
+        for item in THREADS(document(html)):
+            if len(STICKY(item)) > 0:
+                stats.count("skip.sticky")
+                continue
+            thread_data_name = FIRST_LINK(item)[0].get("href")
+            thread_data_row = THREAD_STATS(item)
+            thread_data_scladniks = 0
+            thread_data_views = 0
+            if len(thread_data_row) > 0:
+                thread_data_scladniks = first_text(MAJOR, thread_data_row[0])
+                thread_data_views = first_text(MINOR, thread_data_row[0])
+            scladchina_threads.append(
+                [thread_data_name, thread_data_scladniks, thread_data_views]
+            )
+        return scladchina_threads
+
+
+RATING_SPAN = re.compile(
+    rb"<span\b[^>]*\bclass\s*=\s*[\"'][^\"']*"
+    rb"(?<![\w-])cp-hero__rating-text(?![\w-])[^>]*>(.*?)</span>",
+    re.S,
+)
+TAG = re.compile(rb"<[^>]*>")
+
+
+class WeeklyViewsScanner:
+    """Find weekly views in course page while it is downloaded
+
+    The rating span sits near the top of the page, so the download can
+    stop as soon as it is seen. When the fast pattern finds no views,
+    the whole page has to be read and parsed by the extractor.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.searched = 0
+        self.value: str | None = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add downloaded chunk, True when weekly views are found"""
+
+        self.buffer += chunk
+        # keep overlap for span split between chunks
+        start = max(0, self.searched - 1024)
+        self.searched = len(self.buffer)
+        match = RATING_SPAN.search(self.buffer, start)
+        if match == None:
+            return False
+        weekly_views = re.search(rb"\d+", TAG.sub(b"", match.group(1)))
+        if weekly_views == None:
+            return False
+        self.value = weekly_views.group().decode("ascii")
+        return True
+
+    def text(self, encoding: str | None) -> str:
+        """Get downloaded page text"""
+
+        return self.buffer.decode(encoding or "utf-8", "replace")
+
+
+EXTRACTORS = {"lxml": LxmlExtractor(), "bs4": SoupExtractor()}
+
+current = EXTRACTORS["lxml"]
+
+
+def use_extractor(name: str) -> None:
+    """Select extraction backend"""
+
+    global current
+    current = EXTRACTORS[name]
+
+
+def extractor() -> LxmlExtractor | SoupExtractor:
+    """Get selected extraction backend"""
+
+    return current
@@ -0,0 +1,94 @@
+import json
+import atexit
+import hashlib
+import zipfile
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+
+def fixture_key(url: str) -> str:
+    """Get archive key of url: host, path and query"""
+
+    parts = urlsplit(url)
+    key = f"{parts.netloc}{parts.path or '/'}"
+    if parts.query:
+        key += f"?{parts.query}"
+    return key
+
+
+@dataclass
+class Fixture:
+    url: str
+    status: int
+    content_type: str | None
+    body: bytes
+
+
+class FixtureRecorder:
+    """Writes responses of a run into a zip fixture archive
+
+    Every response body is an entry named by url hash, its url, status
+    and content type are kept in the entry comment, so the archive needs
+    no separate index. Archive is appended to, so all scrapers can record
+    into one file; a url already in it is not recorded again. Disabled
+    until `open` is called.
+    """
+
+    def __init__(self) -> None:
+        self.archive: zipfile.ZipFile | None = None
+        self.lock = threading.Lock()
+        self.recorded: set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.archive is not None
+
+    def open(self, filename: str) -> None:
+        """Start recording into archive"""
+
+        self.archive = zipfile.ZipFile(filename, "a", zipfile.ZIP_DEFLATED)
+        for info in self.archive.infolist():
+            self.recorded.add(fixture_key(json.loads(info.comment)["url"]))
+        atexit.register(self.close)
+
+    def record(
+        self, url: str, status: int, content_type: str | None, body: bytes
+    ) -> None:
+        """Add response to archive"""
+
+        key = fixture_key(url)
+        info = zipfile.ZipInfo(hashlib.sha1(key.encode()).hexdigest())
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.comment = json.dumps(
+            {"url": url, "status": status, "content_type": content_type}
+        ).encode()
+        with self.lock:
+            if self.archive is None or key in self.recorded:
+                return
+            self.recorded.add(key)
+            self.archive.writestr(info, body)
+
+    def close(self) -> None:
+        """Write archive directory and stop recording"""
+
+        with self.lock:
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+
+
+def load_fixtures(filename: str) -> dict[str, Fixture]:
+    """Get recorded responses by archive key"""
+
+    fixtures = {}
+    with zipfile.ZipFile(filename) as archive:
+        for info in archive.infolist():
+            meta = json.loads(info.comment)
+            fixtures[fixture_key(meta["url"])] = Fixture(
+                meta["url"],
+                meta["status"],
+                meta["content_type"],
+                archive.read(info),
+            )
+    return fixtures
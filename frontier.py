@@ -0,0 +1,142 @@
+import os
+import re
+import array
+import bisect
+import hashlib
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from checkpoint import replace_file
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# XenForo thread url keeps its id when the title slug changes
+THREAD_PATH = re.compile(r"/threads/(?:[^/]*\.)?(\d+)(?:/.*)?$")
+
+
+def canonical_url(url: str, base: str = "") -> str:
+    """Get absolute url with one spelling for the same page
+
+    Scheme and host are lowercased, default port, fragment and repeated
+    slashes are dropped, query parameters are sorted and thread urls are
+    reduced to the thread id.
+    """
+
+    parts = urlsplit(urljoin(base, url.strip()))
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.port != None and DEFAULT_PORTS.get(scheme) == parts.port:
+        netloc = netloc.rsplit(":", 1)[0]
+    path = re.sub("/{2,}", "/", parts.path) or "/"
+    thread = THREAD_PATH.search(path)
+    if thread != None:
+        path = f"{path[: thread.start()]}/threads/{thread.group(1)}/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def url_hash(url: str) -> int:
+    """Get 64-bit key of canonical url"""
+
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def merge_keys(keys: array.array, new_keys: set[int]) -> array.array:
+    """Get sorted keys with new ones inserted, in linear time
+
+    Only new keys are sorted, runs of old keys between them are copied
+    as array slices.
+    """
+
+    merged = array.array("Q")
+    start = 0
+    for key in sorted(new_keys):
+        end = bisect.bisect_left(keys, key, start)
+        merged.extend(keys[start:end])
+        merged.append(key)
+        start = end
+    merged.extend(keys[start:])
+    return merged
+
+
+class Frontier:
+    """Canonical urls seen in a run, kept in a sorted key file
+
+    Urls are stored as sorted 64-bit hashes, 8 bytes per url, so even
+    millions of threads fit in memory and on disk. New urls are kept in
+    a set and merged into the sorted keys on `save`, which is attached to
+    history checkpoints: a resumed run gets back exactly the urls of the
+    pages merged before its checkpoint. State is kept in
+    `<history file>.frontier`.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = f"{filename}.frontier"
+        self.timestamp = ""
+        self.keys = array.array("Q")
+        self.new_keys: set[int] = set()
+        self.lock = threading.Lock()
+
+    def start_run(self, timestamp: str) -> None:
+        """Start with urls saved by interrupted run of timestamp, if any"""
+
+        self.timestamp = timestamp
+        self.keys = array.array("Q")
+        self.new_keys = set()
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, "rb") as file:
+            saved_timestamp = file.readline().decode("utf-8").rstrip("\n")
+            if saved_timestamp == timestamp:
+                self.keys.frombytes(file.read())
+
+    def __contains__(self, url: str) -> bool:
+        key = url_hash(url)
+        with self.lock:
+            if key in self.new_keys:
+                return True
+            i = bisect.bisect_left(self.keys, key)
+            return i < len(self.keys) and self.keys[i] == key
+
+    def add(self, url: str) -> bool:
+        """Mark canonical url as seen, False if it already was"""
+
+        key = url_hash(url)
+        with self.lock:
+            i = bisect.bisect_left(self.keys, key)
+            if key in self.new_keys or (
+                i < len(self.keys) and self.keys[i] == key
+            ):
+                return False
+            self.new_keys.add(key)
+        return True
+
+    def discard(self, urls: list[str]) -> None:
+        """Forget urls added since last save"""
+
+        with self.lock:
+            for url in urls:
+                self.new_keys.discard(url_hash(url))
+
+    def save(self) -> None:
+        """Merge new urls into sorted keys and write them atomically"""
+
+        with self.lock:
+            if len(self.new_keys) > 0:
+                self.keys = merge_keys(self.keys, self.new_keys)
+                self.new_keys = set()
+            keys = self.keys
+
+        def write(file) -> None:
+            file.write(f"{self.timestamp}\n".encode("utf-8"))
+            file.write(keys.tobytes())
+
+        replace_file(self.filename, write, mode="wb")
+
+    def remove(self) -> None:
+        """Remove state of finished run"""
+
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,173 @@
+import os
+import csv
+import datetime
+
+from checkpoint import replace_file, write_checkpoint
+from stats import stats
+
+# value of items not refreshed in a run stopped by its limit
+NOT_REFRESHED = "-"
+
+
+def get_csv(filename: str) -> list[list[str]]:
+    """Get all data from csv"""
+
+    with open(filename, "r", encoding="Windows-1251", newline="") as file:
+        reader = csv.reader(file, delimiter=",")
+        csv_data = [item for item in reader]
+        return csv_data
+
+
+def add_to_csv(filename: str, data: list[list[str]]) -> None:
+    """Replace csv file with data"""
+
+    def write(file):
+        writer = csv.writer(file, delimiter=",")
+        for item in data:
+            writer.writerow(item)
+
+    replace_file(filename, write, encoding="Windows-1251", newline="")
+
+
+class BaseHistory:
+    """Run bookkeeping shared by history storages
+
+    Subclasses implement `merge_rows` and `write`. Every
+    `checkpoint_every` merged pages (0 - only on close) the storage is
+    written and the position of the last merged page is saved to the
+    checkpoint file, so an interrupted run can be resumed. Attached run
+    state is saved together with the storage.
+    """
+
+    def __init__(
+        self, filename: str, values_count: int = 1, checkpoint_every: int = 0
+    ) -> None:
+        self.filename = filename
+        self.values_count = values_count
+        self.checkpoint_every = checkpoint_every
+        self.pages_merged = 0
+        self.timestamp = ""
+        self.progress: dict | None = None
+        self.attached = []
+
+    def merge(self, data: list[list[str]], progress: dict | None = None):
+        """Merge page data, `progress` is the position of the page"""
+
+        with stats.timer("history.merge"):
+            self.merge_rows(data)
+        stats.count("history.pages")
+        stats.count("history.rows", len(data))
+        if progress is not None:
+            self.progress = progress
+
+        self.pages_merged += 1
+        if (
+            self.checkpoint_every > 0
+            and self.pages_merged % self.checkpoint_every == 0
+        ):
+            self.save()
+
+    def attach(self, state) -> None:
+        """Call `state.save()` on every save, before the checkpoint"""
+
+        self.attached.append(state)
+
+    def merge_rows(self, data: list[list[str]]) -> None:
+        raise NotImplementedError
+
+    def mark_unrefreshed(self) -> None:
+        raise NotImplementedError
+
+    def write(self) -> None:
+        raise NotImplementedError
+
+    def save(self) -> None:
+        """Write storage, then checkpoint"""
+
+        with stats.timer("history.write"):
+            self.write()
+        for state in self.attached:
+            state.save()
+        if self.progress is not None:
+            write_checkpoint(self.filename, self.timestamp, self.progress)
+
+    def close(self) -> None:
+        """Write final state"""
+
+        self.save()
+
+
+class CsvHistory(BaseHistory):
+    """Wide history table: one row per key, one column group per run
+
+    Rows are kept in memory together with a key -> row index, so merging
+    a page costs O(page size) instead of a scan over the whole table. The
+    file is read once and replaced atomically on every save.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        values_count: int = 1,
+        checkpoint_every: int = 0,
+        load: bool = True,
+    ) -> None:
+        super().__init__(filename, values_count, checkpoint_every)
+        self.rows: list[list[str]] = [[""]]
+        self.index: dict[str, int] = {}
+        if load and os.path.exists(filename):
+            self.rows = get_csv(filename)
+        for i, row in enumerate(self.rows[1:], start=1):
+            if len(row) > 0:
+                self.index.setdefault(row[0], i)
+
+    def start_snapshot(self, timestamp: str | None = None) -> None:
+        """Add new snapshot column to the header"""
+
+        if timestamp is None:
+            timestamp = str(datetime.datetime.now())
+        self.timestamp = timestamp
+        self.rows[0].append(timestamp)
+        self.rows[0].extend([""] * (self.values_count - 1))
+
+    def resume_snapshot(self, timestamp: str) -> None:
+        """Continue snapshot column of interrupted run"""
+
+        column = len(self.rows[0]) - self.values_count
+        if column < 1 or self.rows[0][column] != timestamp:
+            self.start_snapshot(timestamp)
+        else:
+            self.timestamp = timestamp
+
+    def merge_rows(self, data: list[list[str]]) -> None:
+        """Merge page data into current snapshot column"""
+
+        headers_len = len(self.rows[0])
+        for data_item in data:
+            i = self.index.get(data_item[0])
+            if i is not None:
+                row = self.rows[i]
+                if len(row) == headers_len - self.values_count:
+                    row.extend(data_item[1:])
+            elif headers_len >= len(data_item):
+                self.index[data_item[0]] = len(self.rows)
+                self.rows.append(
+                    [
+                        data_item[0],
+                        *[""] * (headers_len - len(data_item)),
+                        *data_item[1:],
+                    ]
+                )
+
+    def mark_unrefreshed(self) -> None:
+        """Fill current snapshot of items not merged in it"""
+
+        headers_len = len(self.rows[0])
+        for row in self.rows[1:]:
+            if len(row) == headers_len - self.values_count:
+                row.extend([NOT_REFRESHED] * self.values_count)
+
+    def write(self) -> None:
+        """Write table to csv file"""
+
+        add_to_csv(self.filename, self.rows)
@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass
+
+# (url pattern, seconds) - first matching pattern sets time to live
+DEFAULT_TTLS = [
+    (r"skladchina\.[a-z]+/?$", 24 * 60 * 60),
+    (r"PAGEN_1=|/page-\d+", 30 * 60),
+    (r".*", 30 * 60),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    filename: str
+    content_type: str | None
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    fresh: bool
+
+    def validators(self) -> dict[str, str]:
+        """Get conditional request headers"""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def charset(self) -> str | None:
+        """Get charset of stored content type"""
+
+        match = re.search(r"charset=([\w-]+)", self.content_type or "")
+        return match.group(1) if match else None
+
+
+class ResponseCache:
+    """On-disk cache of GET response bodies
+
+    Bodies are stored zlib-compressed, the index is a SQLite table in the
+    same directory. Entries are fresh for the TTL of the first matching
+    url pattern, stale entries are revalidated with their ETag and
+    Last-Modified. When the bodies outgrow `max_size` bytes, least
+    recently used entries are removed. Disabled until `open` is called.
+    """
+
+    def __init__(self) -> None:
+        self.directory: str | None = None
+        self.connection: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+        self.max_size = 0
+        self.size = 0
+        self.ttls: list[tuple[re.Pattern, float]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.connection is not None
+
+    def open(
+        self,
+        directory: str,
+        max_size: int = 500 * 1024 * 1024,
+        ttls: list[tuple[str, float]] | None = None,
+    ) -> None:
+        """Enable cache stored in directory"""
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.ttls = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (ttls or []) + DEFAULT_TTLS
+        ]
+        self.connection = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), check_same_thread=False
+        )
+        self.connection.executescript(SCHEMA)
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        """Disable cache, entries stay in its directory"""
+
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+
+    def ttl(self, url: str) -> float:
+        """Get time to live of url"""
+
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return 0
+
+    def get(self, url: str) -> CacheEntry | None:
+        """Get cache entry of url or None"""
+
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT filename, content_type, etag, last_modified, "
+                "stored_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE url = ?",
+                    (now, url),
+                )
+        filename, content_type, etag, last_modified, stored_at = row
+        return CacheEntry(
+            url,
+            filename,
+            content_type,
+            etag,
+            last_modified,
+            stored_at,
+            fresh=now - stored_at < self.ttl(url),
+        )
+
+    def read(self, entry: CacheEntry) -> bytes | None:
+        """Get body of entry, None if its file is lost"""
+
+        try:
+            with open(os.path.join(self.directory, entry.filename), "rb") as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+    def touch(self, entry: CacheEntry) -> None:
+        """Mark entry revalidated by 304 response"""
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE entries SET stored_at = ? WHERE url = ?",
+                (time.time(), entry.url),
+            )
+
+    def store(self, url: str, headers, body: bytes) -> None:
+        """Store response body with its validators"""
+
+        filename = hashlib.sha1(url.encode()).hexdigest() + ".z"
+        data = zlib.compress(body)
+        with open(os.path.join(self.directory, filename), "wb") as file:
+            file.write(data)
+
+        now = time.time()
+        with self.lock:
+            old = self.connection.execute(
+                "SELECT size FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        url,
+                        filename,
+                        headers.get("Content-Type"),
+                        headers.get("ETag"),
+                        headers.get("Last-Modified"),
+                        len(data),
+                        now,
+                        now,
+                    ),
+                )
+            self.size += len(data) - (old[0] if old else 0)
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries down to 90% of max size"""
+
+        rows = self.connection.execute(
+            "SELECT url, filename, size FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        removed = []
+        for url, filename, size in rows:
+            if self.size <= self.max_size * 0.9:
+                break
+            removed.append((url,))
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM entries WHERE url = ?", removed
+            )
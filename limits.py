@@ -0,0 +1,81 @@
+import re
+import time
+import argparse
+import threading
+
+from stats import stats
+
+DURATION = re.compile(r"(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?")
+
+
+class LimitReached(Exception):
+    """No more requests are allowed in this run"""
+
+
+class CrawlLimit:
+    """Requests and time allowed for a run
+
+    Every request attempt sent to the network takes one request of the
+    limit, cache hits are free. The deadline is counted from `configure`;
+    a request is not started when it would likely end after the deadline,
+    going by the mean request time so far. Once reached the limit stays
+    reached.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.configure()
+
+    def configure(
+        self, max_requests: int | None = None, deadline: float | None = None
+    ) -> None:
+        """Set limits, None - unlimited; `deadline` is seconds from now"""
+
+        self.max_requests = max_requests
+        self.deadline = None
+        if deadline != None:
+            self.deadline = time.monotonic() + deadline
+        self.requests = 0
+        self.stopped = False
+
+    @property
+    def active(self) -> bool:
+        """Check if any limit is set"""
+
+        return self.max_requests != None or self.deadline != None
+
+    def reached(self) -> bool:
+        """Check if next request would exceed the limit"""
+
+        if self.stopped:
+            return True
+        if self.max_requests != None and self.requests >= self.max_requests:
+            self.stopped = True
+        if self.deadline != None:
+            expected = stats.mean("http.ttfb") + stats.mean("http.body")
+            if time.monotonic() + expected >= self.deadline:
+                self.stopped = True
+        return self.stopped
+
+    def check(self) -> None:
+        """Take one request of the limit, raise LimitReached if none left"""
+
+        with self.lock:
+            if self.reached():
+                raise LimitReached()
+            self.requests += 1
+
+
+limit = CrawlLimit()
+
+
+def parse_duration(text: str) -> float:
+    """Get seconds of duration such as 20m, 1h30m, 45s or 90"""
+
+    if text.isdigit():
+        return float(text)
+    match = DURATION.fullmatch(text)
+    if text == "" or match == None:
+        raise argparse.ArgumentTypeError(f"invalid duration: {text}")
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return float(hours * 3600 + minutes * 60 + seconds)
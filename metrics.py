@@ -0,0 +1,146 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from client import throttle
+from stats import BUCKETS, stats
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+PREFIX = "scraper_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metric_name(name: str) -> str:
+    """Get Prometheus metric name of stats name"""
+
+    return PREFIX + name.replace(".", "_").replace("-", "_")
+
+
+def label(value: str) -> str:
+    """Escape label value"""
+
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+def memory() -> dict[str, float]:
+    """Get resident memory and its peak, bytes, where the OS tells"""
+
+    values = {}
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        values["memory_rss_bytes"] = pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource != None:
+        # KB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        values["memory_max_rss_bytes"] = peak * 1024
+    return values
+
+
+def render() -> str:
+    """Get all run metrics in Prometheus text format"""
+
+    snapshot = stats.snapshot()
+    lines = []
+
+    def family(name: str, kind: str, help_text: str) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    name = metric_name("uptime_seconds")
+    family(name, "gauge", "Seconds since run start")
+    lines.append(f"{name} {snapshot['elapsed']:.3f}")
+
+    pages = snapshot["counters"].get("history.pages", 0)
+    name = metric_name("pages_per_second")
+    family(name, "gauge", "Pages merged per second since run start")
+    lines.append(f"{name} {pages / max(snapshot['elapsed'], 1e-9):.3f}")
+
+    for counter, value in snapshot["counters"].items():
+        name = metric_name(counter) + "_total"
+        family(name, "counter", f"Count of {counter}")
+        lines.append(f"{name} {value}")
+
+    for counter, hosts in snapshot["host_counters"].items():
+        name = metric_name(counter.replace("http.", "host.")) + "_total"
+        family(name, "counter", f"Count of {counter} per host")
+        for host, value in hosts.items():
+            lines.append(f'{name}{{host="{label(host)}"}} {value}')
+
+    for gauge, value in snapshot["gauges"].items():
+        name = metric_name(gauge) + "_depth"
+        family(name, "gauge", f"Current {gauge}")
+        lines.append(f"{name} {value:g}")
+
+    in_flight = metric_name("in_flight_requests")
+    limit = metric_name("concurrency_limit")
+    # slot of a request is freed when headers arrive, before its body is read
+    family(in_flight, "gauge", "Requests awaiting response headers per host")
+    hosts = list(throttle.hosts.items())
+    for host, host_throttle in hosts:
+        lines.append(
+            f'{in_flight}{{host="{label(host)}"}} {host_throttle.in_flight}'
+        )
+    family(limit, "gauge", "Adaptive concurrency limit per host")
+    for host, host_throttle in hosts:
+        lines.append(
+            f'{limit}{{host="{label(host)}"}} '
+            f"{host_throttle.limiter.limit:.3f}"
+        )
+
+    for histogram_name, histogram in snapshot["histograms"].items():
+        name = metric_name(histogram_name) + "_seconds"
+        family(name, "histogram", f"Duration of {histogram_name}")
+        cumulative = 0
+        counts = list(histogram["buckets"].values())
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+        lines.append(f"{name}_sum {histogram['sum']:.6f}")
+        lines.append(f"{name}_count {histogram['count']}")
+
+    for memory_name, value in memory().items():
+        name = metric_name(memory_name)
+        family(name, "gauge", "Process memory")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves metrics on /metrics"""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def start_metrics_server(
+    port: int, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """Serve metrics from background thread for the rest of the run"""
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
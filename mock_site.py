@@ -0,0 +1,323 @@
+import re
+import zlib
+import random
+import asyncio
+import argparse
+import threading
+from typing import Callable
+
+from aiohttp import web
+
+from fixtures import Fixture, fixture_key, load_fixtures
+
+CATALOG_PAGE = re.compile(r"^/catalog/?$")
+COURSE_PAGE = re.compile(r"^/course/(\d+)/?$")
+AUTHORS_PAGE = re.compile(r"^/authors/*$")
+SECTION_PAGE = re.compile(r"^/forums/section\.(\d+)/(?:page-(\d+))?$")
+
+
+class MockSite:
+    """Local site replaying recorded responses for offline runs
+
+    Requests are answered from the fixture archive by host (the
+    X-Forwarded-Host of rebased requests), path and query, then by path
+    and query alone. Other catalog, course, authors and skladchina pages
+    are synthesized in the markup the scrapers parse, with deterministic
+    values, and carry an ETag: a request with the same If-None-Match
+    gets 304 Not Modified. Every response is delayed by `latency`
+    seconds give or take `jitter`, `error_rate` of them fail with
+    `error_status`.
+    """
+
+    def __init__(
+        self,
+        fixtures: dict[str, Fixture] | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        catalog_pages: int = 50,
+        items_per_page: int = 20,
+        authors_pages: int = 10,
+        sections: int = 5,
+        section_pages: int = 10,
+        threads_per_page: int = 20,
+        page_size: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.fixtures = fixtures or {}
+        self.paths = {
+            key[key.index("/") :]: fixture
+            for key, fixture in self.fixtures.items()
+        }
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.catalog_pages = catalog_pages
+        self.items_per_page = items_per_page
+        self.authors_pages = authors_pages
+        self.sections = sections
+        self.section_pages = section_pages
+        self.threads_per_page = threads_per_page
+        self.page_size = page_size
+        self.seed = seed
+        self.requests = 0
+
+    def value(self, key: str, maximum: int = 5000) -> int:
+        """Get deterministic synthetic value of key"""
+
+        return zlib.crc32(f"{self.seed}:{key}".encode()) % maximum
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Answer request after latency, with error or page"""
+
+        self.requests += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.error_rate:
+            return web.Response(status=self.error_status)
+
+        path_qs = request.rel_url.raw_path_qs
+        host = request.headers.get("X-Forwarded-Host", request.host)
+        fixture = self.fixtures.get(fixture_key(f"//{host}{path_qs}"))
+        if fixture == None:
+            fixture = self.paths.get(path_qs)
+        if fixture != None:
+            response = web.Response(status=fixture.status, body=fixture.body)
+            if fixture.content_type:
+                response.headers["Content-Type"] = fixture.content_type
+            return response
+
+        html = self.synthesize(request.path, request.query)
+        if html == None:
+            return web.Response(status=404)
+        etag = f'"{zlib.crc32(html.encode()):08x}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            text=html, content_type="text/html", headers={"ETag": etag}
+        )
+
+    def synthesize(self, path: str, query) -> str | None:
+        """Get synthetic page of path or None"""
+
+        page = int(query.get("PAGEN_1", "1"))
+        if CATALOG_PAGE.match(path):
+            return self.catalog(page)
+        match = COURSE_PAGE.match(path)
+        if match:
+            return self.course(int(match.group(1)))
+        if AUTHORS_PAGE.match(path):
+            return self.authors(page)
+        if path == "/":
+            return self.forum()
+        match = SECTION_PAGE.match(path)
+        if match:
+            return self.section(int(match.group(1)), int(match.group(2) or 1))
+        return None
+
+    def navigation(self, pages: int) -> str:
+        """Get catalog and authors page navigation"""
+
+        return (
+            f'<div class="navigation"><a>1</a><a>{pages}</a>'
+            "<a>next</a></div>"
+        )
+
+    def catalog(self, page: int) -> str:
+        """Get catalog page, first item of every page is an away link"""
+
+        items = ['<a class="catalog__item__link" href="/away.php?to=x"></a>']
+        for i in range(1, self.items_per_page):
+            number = (page - 1) * self.items_per_page + i
+            items.append(
+                f'<a class="catalog__item__link" href="/course/{number}/">'
+                f"Course {number}</a>"
+            )
+        if page > self.catalog_pages:
+            items = []
+        body = "".join(
+            f'<div class="catalog__item">{item}</div>' for item in items
+        )
+        return (
+            f"<html><body>{self.navigation(self.catalog_pages)}"
+            f"{body}</body></html>"
+        )
+
+    def course(self, number: int) -> str:
+        """Get course page, every tenth has no rating"""
+
+        rating = ""
+        if number % 10 != 0:
+            views = self.value(f"course{number}")
+            rating = (
+                '<span class="cp-hero__rating-text">'
+                f"{views} просмотров за неделю</span>"
+            )
+        html = (
+            f'<html><body><div class="cp-hero"><h1>Course {number}</h1>'
+            f"{rating}</div>"
+        )
+        padding = self.page_size - len(html)
+        if padding > 0:
+            html += f"<p>{'x' * padding}</p>"
+        return html + "</body></html>"
+
+    def authors(self, page: int) -> str:
+        """Get authors page"""
+
+        items = []
+        if page <= self.authors_pages:
+            for i in range(self.items_per_page):
+                key = f"author{page}-{i}"
+                items.append(
+                    '<div class="author-item_wrap">'
+                    f'<div class="author-item-name">Author {page}-{i}</div>'
+                    '<div class="author-item-stat"><ul>'
+                    f"<li><span>{self.value(key)}</span></li>"
+                    f"<li><span>{self.value(key, 100)}</span></li>"
+                    "</ul></div></div>"
+                )
+        return (
+            f"<html><body>{self.navigation(self.authors_pages)}"
+            f"{''.join(items)}</body></html>"
+        )
+
+    def forum(self) -> str:
+        """Get skladchina main page"""
+
+        sections = "".join(
+            f'<li><h3 class="nodeTitle"><a href="forums/section.{i}/">'
+            f"Section {i}</a></h3></li>"
+            for i in range(self.sections)
+        )
+        return (
+            '<html><body><ol><li class="node category level_1 node_46">'
+            f'<ol class="nodeList">{sections}</ol></li></ol></body></html>'
+        )
+
+    def section(self, section: int, page: int) -> str:
+        """Get skladchina threads page, first thread of page is sticky"""
+
+        navigation = ""
+        if self.section_pages > 1:
+            navigation = (
+                '<div class="PageNav"><nav><a>1</a>'
+                f"<a>{self.section_pages}</a><a>Next</a></nav></div>"
+            )
+        threads = []
+        if page <= self.section_pages:
+            for i in range(self.threads_per_page):
+                thread = (
+                    f"{section}-{(page - 1) * self.threads_per_page + i}"
+                )
+                sticky = ""
+                if i == 0:
+                    sticky = '<span class="sticky">Sticky</span>'
+                threads.append(
+                    f'<li class="discussionListItem">'
+                    f'<a href="threads/{thread}/">Thread {thread}</a>'
+                    f"{sticky}"
+                    '<div class="listBlock stats pairsJustified">'
+                    '<dl class="major"><dt>Members</dt>'
+                    f"<dd>{self.value(thread, 300)}</dd></dl>"
+                    '<dl class="minor"><dt>Views</dt>'
+                    f"<dd>{self.value(thread)}</dd></dl></div></li>"
+                )
+        return (
+            f"<html><body>{navigation}<ol>{''.join(threads)}</ol>"
+            "</body></html>"
+        )
+
+    def application(self) -> web.Application:
+        """Get aiohttp application answering every url"""
+
+        app = web.Application()
+        app.router.add_route("GET", "/{tail:.*}", self.handle)
+        return app
+
+
+def serve_in_thread(
+    site: MockSite, host: str = "127.0.0.1", port: int = 0
+) -> tuple[str, Callable[[], None]]:
+    """Run site in background thread, get its base url and stop function"""
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(site.application())
+    loop.run_until_complete(runner.setup())
+    server = web.TCPSite(runner, host, port)
+    loop.run_until_complete(server.start())
+    port = runner.addresses[0][1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return f"http://{host}:{port}", stop
+
+
+def main() -> None:
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Serve recorded or synthetic pages for offline runs"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fixtures", help="zip fixture archive to replay")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="response delay, s"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="random delay spread, s"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of responses failing with --error-status",
+    )
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--catalog-pages", type=int, default=50)
+    parser.add_argument("--items-per-page", type=int, default=20)
+    parser.add_argument("--authors-pages", type=int, default=10)
+    parser.add_argument("--sections", type=int, default=5)
+    parser.add_argument("--section-pages", type=int, default=10)
+    parser.add_argument("--threads-per-page", type=int, default=20)
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=0,
+        help="pad course pages to this many characters",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="changes synthetic values"
+    )
+    args = parser.parse_args()
+
+    site = MockSite(
+        fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        catalog_pages=args.catalog_pages,
+        items_per_page=args.items_per_page,
+        authors_pages=args.authors_pages,
+        sections=args.sections,
+        section_pages=args.section_pages,
+        threads_per_page=args.threads_per_page,
+        page_size=args.page_size,
+        seed=args.seed,
+    )
+    web.run_app(site.application(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
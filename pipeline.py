@@ -0,0 +1,190 @@
+import math
+import queue
+import argparse
+import threading
+from typing import Callable, Iterable
+
+from stats import stats
+
+# end of a queue, put once for every consumer
+DONE = object()
+
+
+class Pipeline:
+    """Stages run by own worker threads and joined by bounded queues
+
+    `stages` are (name, function, workers): every task goes through all
+    stages in turn, a stage function gets the task and the result of the
+    previous stage (the task itself for the first one). Results reach the
+    writer, called from the thread running `run`, in task order, so
+    history and checkpoints are the same as in a sequential crawl.
+
+    A stage putting into a full queue waits, and at most `window` tasks
+    are between the feeder and the writer, so memory is capped whatever
+    stage is the slowest. Queue depths go to `queue.<stage>` gauges.
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable, int]],
+        queue_size: int = 8,
+        window: int | None = None,
+    ) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        if window == None:
+            window = queue_size * (len(stages) + 1) + sum(
+                workers for _, _, workers in stages
+            )
+        self.window = window
+        self.lock = threading.Lock()
+
+    def fail(self, sequence: float, error: BaseException) -> None:
+        """Keep error of earliest task, make stages skip tasks after it"""
+
+        with self.lock:
+            if sequence < self.failed_at:
+                self.failed_at = sequence
+                self.error = error
+        # wake feeder waiting for a free place in window
+        self.capacity.release()
+
+    def put(self, name: str, output: queue.Queue, item) -> None:
+        stats.add_gauge(f"queue.{name}", 1)
+        output.put(item)
+
+    def feed(self, tasks: Iterable, output: queue.Queue) -> None:
+        """Put numbered tasks into first queue"""
+
+        name, _, workers = self.stages[0]
+        sequence = 0
+        try:
+            for sequence, task in enumerate(tasks):
+                self.capacity.acquire()
+                if sequence > self.failed_at:
+                    break
+                self.put(name, output, (sequence, task, task))
+        except BaseException as error:
+            self.fail(sequence, error)
+        finally:
+            for _ in range(workers):
+                output.put(DONE)
+
+    def work(
+        self,
+        stage: int,
+        source: queue.Queue,
+        output: queue.Queue,
+        remaining: list[int],
+    ) -> None:
+        """Run stage function on tasks until all producers are done"""
+
+        name, function, _ = self.stages[stage]
+        next_name, consumers = "write", 1
+        if stage + 1 < len(self.stages):
+            next_name, _, consumers = self.stages[stage + 1]
+        while True:
+            item = source.get()
+            if item is DONE:
+                break
+            stats.add_gauge(f"queue.{name}", -1)
+            sequence, task, value = item
+            if sequence > self.failed_at:
+                continue
+            try:
+                value = function(task, value)
+            except BaseException as error:
+                self.fail(sequence, error)
+                continue
+            self.put(next_name, output, (sequence, task, value))
+
+        with self.lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(consumers):
+                output.put(DONE)
+
+    def run(self, tasks: Iterable, write: Callable) -> None:
+        """Pass tasks through all stages, call `write(task, result)`
+
+        Raises the error of the earliest failed task after all threads
+        stopped, results of all tasks before it are written.
+        """
+
+        self.error = None
+        self.failed_at = math.inf
+        self.capacity = threading.Semaphore(self.window)
+        queues = [
+            queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        threads = [
+            threading.Thread(
+                target=self.feed, args=(tasks, queues[0]), daemon=True
+            )
+        ]
+        for stage, (_, _, workers) in enumerate(self.stages):
+            remaining = [workers]
+            for _ in range(workers):
+                threads.append(
+                    threading.Thread(
+                        target=self.work,
+                        args=(
+                            stage, queues[stage], queues[stage + 1], remaining
+                        ),
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_sequence = 0
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is DONE:
+                    break
+                stats.add_gauge("queue.write", -1)
+                sequence, task, value = item
+                if sequence > self.failed_at:
+                    continue
+                pending[sequence] = (task, value)
+                while next_sequence in pending:
+                    task, value = pending.pop(next_sequence)
+                    write(task, value)
+                    next_sequence += 1
+                    self.capacity.release()
+        except BaseException as error:
+            self.fail(-1, error)
+            # let stages skip the rest and finish
+            while queues[-1].get() is not DONE:
+                stats.add_gauge("queue.write", -1)
+        for thread in threads:
+            thread.join()
+        if self.error != None:
+            raise self.error
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add staged pipeline options to parser"""
+
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=0,
+        help="run fetch, parse and write stages concurrently with this "
+        "many threads fetching pages (0 - sequential crawl)",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="pipeline threads parsing pages",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=8,
+        help="pages waiting between pipeline stages",
+    )
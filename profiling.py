@@ -0,0 +1,223 @@
+import io
+import os
+import ast
+import sys
+import pstats
+import cProfile
+import argparse
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import lru_cache
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_FRAMES = 30
+# since 3.12 cProfile is a sys.monitoring tool: one profiler per process,
+# it sees calls of all threads
+THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+@lru_cache(maxsize=None)
+def functions_of(filename: str) -> list[tuple[int, int, str]]:
+    """Get (first line, last line, qualified name) of functions in file"""
+
+    try:
+        with open(filename, encoding="utf-8") as file:
+            tree = ast.parse(file.read())
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError):
+        return []
+
+    functions = []
+
+    def visit(node, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(
+                child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                name = f"{prefix}{child.name}"
+                if not isinstance(child, ast.ClassDef):
+                    functions.append((child.lineno, child.end_lineno, name))
+                visit(child, f"{name}.")
+
+    visit(tree, "")
+    return functions
+
+
+def function_at(filename: str, lineno: int) -> str:
+    """Get name of innermost function holding line, module if none"""
+
+    module = os.path.splitext(os.path.basename(filename))[0]
+    found = None
+    for first, last, name in functions_of(filename):
+        if first <= lineno <= last:
+            if found == None or first >= found[0]:
+                found = (first, name)
+    if found == None:
+        return f"{module}:<module>"
+    return f"{module}.{found[1]}"
+
+
+class Profiler:
+    """cProfile of the run in every thread, optionally with tracemalloc
+
+    cProfile only sees the thread that enabled it, so threads started
+    while profiling get their own profiler on their first call, and all
+    of them are merged in the report. On Python 3.12+ a second profiler
+    can not be enabled, the one of the main thread records all threads
+    on one call stack, so cumulative times of threads are approximate.
+    """
+
+    def __init__(self, memory: bool = False) -> None:
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.profiles: list[cProfile.Profile] = []
+
+    def start(self) -> None:
+        if self.memory:
+            tracemalloc.start(TRACE_FRAMES)
+        if THREAD_PROFILES:
+            threading.setprofile(self.start_thread)
+        else:
+            print(
+                "Python 3.12+: threads share one profiler, "
+                "their cumulative times are approximate",
+                file=sys.stderr,
+            )
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+
+    def start_thread(self, frame, event, arg) -> None:
+        """Replace bootstrap hook by cProfile of new thread"""
+
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def stop(self) -> None:
+        self.profiles[0].disable()
+        if THREAD_PROFILES:
+            threading.setprofile(None)
+
+    def cpu_stats(self) -> pstats.Stats:
+        """Get merged stats of all threads"""
+
+        with self.lock:
+            profiles = list(self.profiles)
+        merged = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            merged.add(profile)
+        return merged
+
+    def cpu_report(self, top: int) -> str:
+        """Get top functions by cumulative and own time"""
+
+        stream = io.StringIO()
+        merged = self.cpu_stats()
+        merged.stream = stream
+        stream.write(f"Top {top} functions by cumulative time\n")
+        merged.sort_stats("cumulative").print_stats(top)
+        stream.write(f"Top {top} functions by own time\n")
+        merged.sort_stats("tottime").print_stats(top)
+        return stream.getvalue()
+
+    def memory_report(self, top: int) -> str:
+        """Get memory still allocated at the end grouped by function
+
+        Allocations are attributed to the allocating function and to the
+        innermost project function on their stack (e.g. CsvHistory
+        merge_rows, get_csv or a parser calling BeautifulSoup).
+        """
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        tracemalloc.stop()
+
+        allocating: dict[str, list[int]] = {}
+        project: dict[str, list[int]] = {}
+        for statistic in snapshot.statistics("traceback"):
+            frames = list(statistic.traceback)
+            # most recent frame is last
+            innermost = frames[-1]
+            group = function_at(innermost.filename, innermost.lineno)
+            total = allocating.setdefault(group, [0, 0])
+            total[0] += statistic.size
+            total[1] += statistic.count
+            for frame in reversed(frames):
+                if frame.filename.startswith(PROJECT_DIR):
+                    group = function_at(frame.filename, frame.lineno)
+                    break
+            else:
+                group = "<outside project>"
+            total = project.setdefault(group, [0, 0])
+            total[0] += statistic.size
+            total[1] += statistic.count
+
+        lines = [
+            f"Traced memory: current {current / 1e6:.1f} MB, "
+            f"peak {peak / 1e6:.1f} MB"
+        ]
+        for title, groups in (
+            ("allocating function", allocating),
+            ("project function", project),
+        ):
+            lines.append(f"Top {top} by {title}")
+            for group, (size, count) in sorted(
+                groups.items(), key=lambda item: item[1][0], reverse=True
+            )[:top]:
+                lines.append(f"{size / 1e6:10.2f} MB {count:9} {group}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profile_run(args: argparse.Namespace):
+    """Profile block when --profile is given
+
+    Writes `<prefix>.pstats` and the `<prefix>.txt` summary, also printed
+    to stderr, even if the run fails.
+    """
+
+    if not args.profile:
+        yield
+        return
+
+    profiler = Profiler(memory=args.profile_memory)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        # before cpu report allocates its own memory
+        memory_report = ""
+        if args.profile_memory:
+            memory_report = profiler.memory_report(args.profile_top)
+        profiler.cpu_stats().dump_stats(f"{args.profile}.pstats")
+        report = profiler.cpu_report(args.profile_top) + memory_report
+        with open(f"{args.profile}.txt", "w", encoding="utf-8") as file:
+            file.write(report)
+        print(report, file=sys.stderr)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add profiling options to parser"""
+
+    parser.add_argument(
+        "--profile",
+        metavar="PREFIX",
+        help="profile run, write PREFIX.pstats and PREFIX.txt summary",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="also trace memory allocations (slow)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=25,
+        help="functions in summary",
+    )
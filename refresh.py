@@ -0,0 +1,217 @@
+import os
+import json
+import math
+import argparse
+from typing import Callable
+
+from tqdm import tqdm
+
+from checkpoint import replace_file
+from storage import History
+
+# weight of value change per run against the value itself in priority
+CHANGE_WEIGHT = 10
+
+
+def numeric(value: str | None) -> int:
+    """Get value as number, 0 when missing"""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class RefreshState:
+    """Run and value of the last fetch of every detail page
+
+    An item is hot when its last value is at least `hot_value` or it
+    changed on its last fetch. Hot items are refetched every run, cold
+    items every `cold_every` runs; in other runs their last value is
+    carried forward. State is kept in `<history file>.refresh.json`.
+
+    With a `budget` only that many items are fetched in a run, the ones
+    of highest `priority`, planned by `plan` once all keys are known.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        hot_value: int = 100,
+        cold_every: int = 7,
+        budget: int | None = None,
+    ) -> None:
+        self.filename = f"{filename}.refresh.json"
+        self.hot_value = hot_value
+        self.cold_every = cold_every
+        self.budget = budget
+        self.planned: set[str] | None = None
+        self.run = 0
+        self.timestamp = ""
+        # key -> [fetched in run, value or None, changed on that fetch,
+        # value change per run on that fetch]
+        self.items: dict[str, list] = {}
+        if os.path.exists(self.filename):
+            with open(self.filename, encoding="utf-8") as file:
+                state = json.load(file)
+            self.run = state["run"]
+            self.timestamp = state["timestamp"]
+            self.items = state["items"]
+
+    def start_run(self, timestamp: str) -> None:
+        """Start run, resumed run keeps its number"""
+
+        if timestamp != self.timestamp:
+            self.run += 1
+            self.timestamp = timestamp
+
+    def is_hot(self, key: str) -> bool:
+        """Check if item has many views or changed on last fetch"""
+
+        value, changed = self.items[key][1:3]
+        return changed or (value is not None and int(value) >= self.hot_value)
+
+    def is_stale(self, key: str) -> bool:
+        """Check if item page must be fetched in this run"""
+
+        if key in self.items and self.items[key][0] == self.run:
+            return False
+        if self.planned != None:
+            return key in self.planned
+        if key not in self.items:
+            return True
+        fetched = self.items[key][0]
+        return self.is_hot(key) or self.run - fetched >= self.cold_every
+
+    def priority(self, key: str) -> float:
+        """Get refresh priority of item
+
+        Recent value plus weighted change per run, multiplied by runs
+        since the last fetch so that quiet items are refreshed too. New
+        items come first, items fetched in this run last.
+        """
+
+        if key not in self.items:
+            return math.inf
+        item = self.items[key]
+        rate = item[3] if len(item) > 3 else 0.0
+        age = self.run - item[0]
+        return (numeric(item[1]) + CHANGE_WEIGHT * rate + 1) * age
+
+    def plan(self, keys: list[str]) -> list[str]:
+        """Get items to fetch in this run, highest priority first
+
+        Without budget these are all stale items. Items outside the plan
+        of a budget are not stale for the rest of the run.
+        """
+
+        keys = list(dict.fromkeys(keys))
+        keys.sort(key=self.priority, reverse=True)
+        if self.budget == None:
+            return [key for key in keys if self.is_stale(key)]
+        planned = [key for key in keys if self.priority(key) > 0]
+        planned = planned[: self.budget]
+        self.planned = set(planned)
+        return planned
+
+    def last_value(self, key: str) -> str | None:
+        """Get value of last fetch, None for never fetched item"""
+
+        if key not in self.items:
+            return None
+        return self.items[key][1]
+
+    def update(self, key: str, value: str | None) -> None:
+        """Record value fetched in this run"""
+
+        changed = False
+        rate = 0.0
+        if key in self.items:
+            fetched, last_value = self.items[key][:2]
+            changed = last_value != value
+            if last_value != None and value != None and fetched < self.run:
+                rate = abs(numeric(value) - numeric(last_value)) / (
+                    self.run - fetched
+                )
+        self.items[key] = [self.run, value, changed, rate]
+
+    def save(self) -> None:
+        """Write state atomically"""
+
+        state = {
+            "run": self.run,
+            "timestamp": self.timestamp,
+            "items": self.items,
+        }
+        replace_file(
+            self.filename,
+            lambda file: json.dump(state, file),
+            encoding="utf-8",
+        )
+
+
+def plan_pages(
+    pages_keys: list[list[str]],
+    refresh: RefreshState | None,
+    has_details: Callable[[str], bool],
+) -> list[str]:
+    """Get keys of listed pages to fetch in this run, by priority
+
+    Only keys with a detail page are fetched, without `refresh` all of
+    them once, in listing order.
+    """
+
+    keys = [key for keys in pages_keys for key in keys if has_details(key)]
+    if refresh == None:
+        return list(dict.fromkeys(keys))
+    return refresh.plan(keys)
+
+
+def merge_pages(
+    history: History,
+    pages: range,
+    pages_keys: list[list[str]],
+    fetched: dict[str, list[str] | None],
+    get_data: Callable[[str], list[str] | None],
+) -> None:
+    """Merge listed pages in order
+
+    Data of items fetched by plan is taken from `fetched`, of the others
+    from `get_data`, which carries values forward without requests.
+    """
+
+    for page, keys in zip(tqdm(pages), pages_keys):
+        page_data = []
+        for key in keys:
+            data = fetched[key] if key in fetched else get_data(key)
+            if data != None:
+                page_data.append(data)
+        history.merge(page_data, progress={"page": page})
+
+
+def add_refresh_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add incremental refresh options to parser"""
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="refetch detail pages only when stale, carry values forward",
+    )
+    parser.add_argument(
+        "--hot-views",
+        type=int,
+        default=100,
+        help="items with at least this many views are refreshed every run",
+    )
+    parser.add_argument(
+        "--cold-every",
+        type=int,
+        default=7,
+        help="refresh other items every N runs",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        help="fetch at most N detail pages per run, most viewed and "
+        "fastest changing first; implies --incremental",
+    )
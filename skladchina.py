@@ -1,237 +1,413 @@
-import os
-import requests
-from requests.adapters import HTTPAdapter
-from bs4 import BeautifulSoup
-from anti_useragent import UserAgent
-import csv
-import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from tqdm import tqdm
 
-from urllib3 import Retry
+from cli import build_parser, configure_client
+from client import create_session, mount_adapter
+from extract import extractor
+from frontier import Frontier, canonical_url
+from pipeline import Pipeline, add_pipeline_arguments
+from profiling import profile_run
+from stats import stats
+from storage import History, open_history, run
 
-ua = UserAgent()
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
-session = requests.Session()
-retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-requests.packages.urllib3.disable_warnings(
-    requests.packages.urllib3.exceptions.InsecureRequestWarning
-)
+session = create_session()
 
 
 def get_scladchins_urls(url: str) -> list[str]:
     """Get all scladnins urls"""
 
     response = session.get(url=url, headers=headers, verify=False)
+    with stats.timer("parse.forum"):
+        return extractor().scladchins_urls(response.text)
 
-    soup = BeautifulSoup(response.text, "lxml")
 
-    scladchins_all = soup.find("li", class_="node category level_1 node_46")
-    scladchins_ol = scladchins_all.find("ol", class_="nodeList")
-    scladchins_li = scladchins_ol.find_all("li")
+def parse_threads_pages_count(html: str) -> int:
+    """Get threads pages count from threads page"""
 
-    scladchins_urls = []
-    for li in scladchins_li:
-        li_title = li.find("h3", class_="nodeTitle")
-        scladchina_href = li_title.find("a").get("href")
-        scladchins_urls.append(scladchina_href)
+    with stats.timer("parse.threads"):
+        return extractor().threads_pages_count(html)
 
-    return scladchins_urls
 
+def parse_threads(html: str) -> list[list[str]]:
+    """Get data of all not sticky threads of threads page"""
 
-def get_threads_pages_count(url: str) -> int:
-    """Get threads pages count"""
+    with stats.timer("parse.threads"):
+        return extractor().threads(html)
 
-    response = session.get(url=url, headers=headers, verify=False)
-
-    soup = BeautifulSoup(response.text, "lxml")
-    try:
-        navigation_panel = soup.find("div", class_="PageNav").find("nav")
-        navigation_titles = navigation_panel.find_all("a")
-    except:
-        return 1
-    return int(navigation_titles[-2].text)
-
-
-def get_headers(filename: str) -> list[str]:
-    """Get csv file header row"""
-
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        return next(reader)
-
-
-def add_headers(filename: str, headers: list[str]) -> None:
-    """Add headers to csv file"""
-
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(headers)
-
-
-def get_csv(filename: str) -> list[list[str]]:
-    """Get all data from csv"""
 
-    with open(filename, "r", encoding="Windows-1251", newline="") as file:
-        reader = csv.reader(file, delimiter=",")
-        csv_data = [item for item in reader]
-        return csv_data
+def get_threads_page(url: str) -> str:
+    """Get threads page text"""
 
-
-def create_csv(filename: str, data: list[str]) -> None:
-    """Create csv file with data"""
-
-    header = ["", datetime.datetime.now(), ""]
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data:
-            writer.writerow(item)
+    response = session.get(url=url, headers=headers, verify=False)
+    return response.text
 
 
-def add_to_csv(filename: str, data: list[str]) -> None:
-    """Add data to csv file"""
+def get_threads_data(url: str) -> list[list[str]]:
+    """Get data of threads page"""
 
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        for item in data:
-            writer.writerow(item)
+    return parse_threads(get_threads_page(url))
 
 
-def new_iteration_csv(filename: str, data: list[str]) -> None:
-    """Add new headers to csv at new parser iteration"""
+def is_seen(url_page: str, frontier: Frontier) -> bool:
+    """Check if threads page was merged in this run"""
 
-    header = get_headers(filename)
-    header.append(str(datetime.datetime.now()))
-    header.append("")
-    with open(filename, "w", encoding="Windows-1251", newline="") as file:
-        writer = csv.writer(file, delimiter=",")
-        writer.writerow(header)
-        for item in data[1:]:
-            writer.writerow(item)
+    if canonical_url(url_page) in frontier:
+        stats.count("skip.duplicate")
+        return True
+    return False
 
 
-def data_to_csv(
-    filename: str, data: list[str], first_dataframe: bool = False
+def merge_threads(
+    url: str,
+    url_page: str,
+    scladchina_threads: list[list[str]],
+    history: History,
+    frontier: Frontier,
+    progress: dict,
 ) -> None:
-    """Add data to csv file or create it"""
-
-    if not os.path.exists(filename):
-        create_csv(filename, data)
-    else:
-        if first_dataframe == True:
-            new_iteration_csv(filename, get_csv(filename))
-
-        csv_data = get_csv(filename)
-
-        headers_len = len(get_headers(filename))
-        for data_item in data:
-            for i, csv_item in enumerate(csv_data):
-                if data_item[0] == csv_item[0]:
-                    if len(csv_item) == headers_len - 2:
-                        csv_data[i].append(data_item[1])
-                        csv_data[i].append(data_item[2])
-                    break
-            else:
-                if headers_len == len(data_item):
-                    csv_data.append(data_item)
-                elif headers_len > len(data_item):
-                    csv_data.append(
-                        [
-                            data_item[0],
-                            *[""] * (headers_len - len(data_item)),
-                            data_item[1],
-                            data_item[2],
-                        ]
-                    )
-
-        add_to_csv(filename, csv_data)
-
-
-def get_thread_data(item) -> list[str]:
-    """Get thread data"""
-
-    thread_data_name = item.find("a").get("href")
-
-    thread_data_row = item.find("div", class_="listBlock stats pairsJustified")
-
-    try:
-        thread_data_scladniks = (
-            thread_data_row.find("dl", class_="major").find("dd").text
+    """Merge threads not merged in this run yet, mark page as merged
+
+    Thread urls are relative to forum main page `url`.
+    """
+
+    keys = []
+    new_threads = []
+    for thread in scladchina_threads:
+        key = canonical_url(thread[0], url)
+        if frontier.add(key):
+            keys.append(key)
+            new_threads.append(thread)
+    if len(new_threads) < len(scladchina_threads):
+        stats.count(
+            "skip.duplicate", len(scladchina_threads) - len(new_threads)
         )
-    except:
-        thread_data_scladniks = 0
+    keys.append(canonical_url(url_page))
+    frontier.add(keys[-1])
     try:
-        thread_data_views = (
-            thread_data_row.find("dl", class_="minor").find("dd").text
-        )
-    except:
-        thread_data_views = 0
-
-    return [thread_data_name, thread_data_scladniks, thread_data_views]
+        history.merge(new_threads, progress=progress)
+    except BaseException:
+        # page is not merged, it is read again on resume
+        frontier.discard(keys)
+        raise
+
+
+def schedule_scladchina_pages(
+    url_scladchina: str,
+    start_page: int,
+    pages_executor: ThreadPoolExecutor,
+    frontier: Frontier,
+) -> list[tuple[int, Future]]:
+    """Read pages count of scladchina, submit its pages to executor"""
+
+    first_page = pages_executor.submit(
+        get_threads_page, f"{url_scladchina}page-1"
+    ).result()
+    sclanchina_pages_count = parse_threads_pages_count(first_page)
+
+    pages = []
+    for page_number in range(start_page, sclanchina_pages_count + 1):
+        if is_seen(f"{url_scladchina}page-{page_number}", frontier):
+            continue
+        if page_number == 1:
+            future = pages_executor.submit(parse_threads, first_page)
+        else:
+            future = pages_executor.submit(
+                get_threads_data, f"{url_scladchina}page-{page_number}"
+            )
+        pages.append((page_number, future))
+    stats.add_gauge("queue.pages", len(pages))
+    return pages
 
 
 def gather_scladchina_data(
-    url_scladchina: str, csv_filename: str, is_first_page: bool
+    url: str,
+    url_scladchina: str,
+    history: History,
+    frontier: Frontier,
+    section: int,
+    start_page: int = 1,
 ):
     """Gather all scladchins data"""
 
-    sclanchina_pages_count = get_threads_pages_count(url_scladchina)
-
-    for page_number in range(1, sclanchina_pages_count + 1):
-        sclanchina_url = f"{url_scladchina}page-{page_number}"
-
-        response = session.get(
-            url=sclanchina_url, headers=headers, verify=False
+    first_page = get_threads_page(f"{url_scladchina}page-1")
+    sclanchina_pages_count = parse_threads_pages_count(first_page)
+
+    for page_number in range(start_page, sclanchina_pages_count + 1):
+        url_page = f"{url_scladchina}page-{page_number}"
+        if is_seen(url_page, frontier):
+            continue
+        if page_number == 1:
+            html = first_page
+        else:
+            html = get_threads_page(url_page)
+        scladchina_threads = parse_threads(html)
+
+        merge_threads(
+            url,
+            url_page,
+            scladchina_threads,
+            history,
+            frontier,
+            {"section": section, "page": page_number},
         )
 
-        soup = BeautifulSoup(response.text, "lxml")
 
-        threads = []
-        for thread in soup.find_all("li", class_="discussionListItem"):
-            if thread.find(class_="sticky"):
+def gather_concurrently(
+    url: str,
+    scladchins: list[str],
+    history: History,
+    frontier: Frontier,
+    start_section: int,
+    start_page: int,
+    section_workers: int,
+    page_workers: int,
+) -> None:
+    """Gather scladchins in parallel, merge pages in section/page order
+
+    Up to `section_workers` scladchins ahead of the merged one have their
+    pages scheduled, all their pages share `page_workers` threads.
+    """
+
+    mount_adapter(session, page_workers)
+    sections_executor = ThreadPoolExecutor(section_workers)
+    pages_executor = ThreadPoolExecutor(page_workers)
+    sections_range = range(start_section, len(scladchins))
+    sections_ahead = iter(sections_range)
+    sections = deque()
+    try:
+        for section in tqdm(sections_range):
+            for section_ahead in sections_ahead:
+                sections.append(
+                    sections_executor.submit(
+                        schedule_scladchina_pages,
+                        f"{url}{scladchins[section_ahead]}",
+                        start_page if section_ahead == start_section else 1,
+                        pages_executor,
+                        frontier,
+                    )
+                )
+                if len(sections) >= section_workers:
+                    break
+            stats.set_gauge("queue.sections", len(sections))
+            for page_number, future in sections.popleft().result():
+                merge_threads(
+                    url,
+                    f"{url}{scladchins[section]}page-{page_number}",
+                    future.result(),
+                    history,
+                    frontier,
+                    {"section": section, "page": page_number},
+                )
+                stats.add_gauge("queue.pages", -1)
+    finally:
+        pages_executor.shutdown(cancel_futures=True)
+        sections_executor.shutdown(cancel_futures=True)
+
+
+def threads_pages(
+    url: str,
+    scladchins: list[str],
+    frontier: Frontier,
+    start_section: int,
+    start_page: int,
+):
+    """Yield (section, page number, page url, page text if already read)
+
+    First page of every scladchina is read here for its pages count,
+    pages merged in this run are skipped.
+    """
+
+    for section in range(start_section, len(scladchins)):
+        url_scladchina = f"{url}{scladchins[section]}"
+        first_page = get_threads_page(f"{url_scladchina}page-1")
+        sclanchina_pages_count = parse_threads_pages_count(first_page)
+        first_number = start_page if section == start_section else 1
+        for page_number in range(first_number, sclanchina_pages_count + 1):
+            url_page = f"{url_scladchina}page-{page_number}"
+            if is_seen(url_page, frontier):
                 continue
-            threads.append(thread)
-        scladchina_threads = []
-        i = 0
-        for thread in threads:
-            item_data = get_thread_data(thread)
-            if item_data != None:
-                scladchina_threads.append(item_data)
-            i += 1
-
-        data_to_csv(csv_filename, scladchina_threads, is_first_page)
-        is_first_page = False
+            yield (
+                section,
+                page_number,
+                url_page,
+                first_page if page_number == 1 else None,
+            )
+
+
+def gather_pipelined(
+    url: str,
+    scladchins: list[str],
+    history: History,
+    frontier: Frontier,
+    start_section: int,
+    start_page: int,
+    fetch_workers: int,
+    parse_workers: int,
+    queue_size: int,
+) -> None:
+    """Fetch, parse and merge threads pages of all scladchins in stages"""
+
+    def fetch(task: tuple, _) -> str:
+        _, _, url_page, html = task
+        if html != None:
+            return html
+        return get_threads_page(url_page)
+
+    mount_adapter(session, fetch_workers + 1)
+    pipeline = Pipeline(
+        [
+            ("fetch", fetch, fetch_workers),
+            ("parse", lambda task, html: parse_threads(html), parse_workers),
+        ],
+        queue_size,
+    )
+    with tqdm(total=len(scladchins) - start_section) as bar:
+
+        def write(task: tuple, scladchina_threads: list[list[str]]) -> None:
+            section, page_number, url_page, _ = task
+            merge_threads(
+                url,
+                url_page,
+                scladchina_threads,
+                history,
+                frontier,
+                {"section": section, "page": page_number},
+            )
+            # scladchins before this one are merged
+            bar.update(section - start_section - bar.n)
+
+        pipeline.run(
+            threads_pages(
+                url, scladchins, frontier, start_section, start_page
+            ),
+            write,
+        )
+        bar.update(bar.total - bar.n)
+
+
+def gather_data(
+    url: str,
+    csv_filename: str,
+    checkpoint_every: int = 20,
+    storage: str = "csv",
+    resume: bool = False,
+    section_workers: int = 1,
+    page_workers: int = 1,
+    fetch_workers: int = 0,
+    parse_workers: int = 1,
+    queue_size: int = 8,
+) -> None:
+    """Gather all data
 
+    With more than one section or page worker scladchins are crawled
+    concurrently, with `fetch_workers` pages go through the staged
+    pipeline. History stays the same as in sequential crawl. When the
+    run limit is reached pages read so far are merged, the rest of the
+    threads are marked as not refreshed and the run is finished.
 
-def gather_data(url: str, csv_filename: str) -> None:
-    """Gather all data"""
+    Threads and pages are merged once per run, by canonical url; the
+    frontier of merged urls is saved with every checkpoint.
+    """
 
-    scladchins = get_scladchins_urls(url)
+    scladchins = {}
+    for scladchina in get_scladchins_urls(url):
+        scladchins.setdefault(canonical_url(scladchina, url), scladchina)
+    scladchins = list(scladchins.values())
 
     scladchins_count = len(scladchins)
-    is_first_page = True
-    for i in tqdm(range(scladchins_count)):
-        url_scladchina = f"{url}{scladchins[i]}"
-        gather_scladchina_data(url_scladchina, csv_filename, is_first_page)
-        is_first_page = False
+    history = open_history(
+        storage,
+        csv_filename,
+        values_count=2,
+        checkpoint_every=checkpoint_every,
+    )
+    frontier = Frontier(csv_filename)
+    with run(history, resume) as progress:
+        frontier.start_run(history.timestamp)
+        history.attach(frontier)
+        start_section = progress.get("section", 0)
+        if fetch_workers > 0:
+            gather_pipelined(
+                url,
+                scladchins,
+                history,
+                frontier,
+                start_section,
+                progress.get("page", 0) + 1,
+                fetch_workers,
+                parse_workers,
+                queue_size,
+            )
+        elif section_workers > 1 or page_workers > 1:
+            gather_concurrently(
+                url,
+                scladchins,
+                history,
+                frontier,
+                start_section,
+                progress.get("page", 0) + 1,
+                section_workers,
+                page_workers,
+            )
+        else:
+            for i in tqdm(range(start_section, scladchins_count)):
+                url_scladchina = f"{url}{scladchins[i]}"
+                start_page = 1
+                if i == start_section:
+                    start_page = progress.get("page", 0) + 1
+                gather_scladchina_data(
+                    url, url_scladchina, history, frontier, i, start_page
+                )
+    frontier.remove()
 
 
 def main() -> None:
     """Main function"""
 
-    main_url = input("Enter main page url for skladchina (Press enter to user default 'https://s107.skladchina.biz/'): ")
+    parser = build_parser(
+        "Gather skladchina threads stats",
+        url=None,
+        filename="E:/scladchina.csv",
+    )
+    parser.add_argument(
+        "--section-workers",
+        type=int,
+        default=1,
+        help="scladchins crawled at once",
+    )
+    parser.add_argument(
+        "--page-workers",
+        type=int,
+        default=1,
+        help="threads fetching threads pages of all scladchins",
+    )
+    add_pipeline_arguments(parser)
+    args = parser.parse_args()
+    configure_client(args)
+
+    main_url = args.url
+    if main_url is None:
+        main_url = input("Enter main page url for skladchina (Press enter to user default 'https://s107.skladchina.biz/'): ")
     if main_url == '':
         main_url = "https://s107.skladchina.biz/"
 
-    gather_data(
-        url=main_url, csv_filename="E:/scladchina.csv"
-    )
+    with profile_run(args):
+        gather_data(
+            url=main_url,
+            csv_filename=args.output,
+            checkpoint_every=args.checkpoint_every,
+            storage=args.storage,
+            resume=args.resume,
+            section_workers=args.section_workers,
+            page_workers=args.page_workers,
+            fetch_workers=args.fetch_workers,
+            parse_workers=args.parse_workers,
+            queue_size=args.queue_size,
+        )
 
 
 if __name__ == "__main__":
@@ -1,22 +1,22 @@
 import os
 import requests
-from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from fake_useragent import UserAgent
 import csv
 import datetime
 import logging
 
 from urllib3 import Retry
 
-ua = UserAgent()
+from client import UserAgentAdapter
+from stats import stats
+
 headers = {
-    "User-Agent": ua.random,
     "Accept": "*/*",
 }
 session = requests.Session()
 retry = Retry(connect=3, backoff_factor=0.5)
-adapter = HTTPAdapter(max_retries=retry)
+# user agent is taken from the pool on the first request
+adapter = UserAgentAdapter(max_retries=retry)
 session.mount("http://", adapter)
 session.mount("https://", adapter)
 requests.packages.urllib3.disable_warnings(
@@ -195,20 +195,22 @@ def gather_scladchina_data(url_scladchina: str, is_first_page: bool):
         threads = []
         for thread in soup.find_all("li", class_="discussionListItem"):
             if thread.find(class_="sticky"):
+                stats.count("skip.sticky")
                 continue
             threads.append(thread)
         scladchina_threads = []
-        i = 0
         for thread in threads:
-            logging.info(f"Item {i+1}/{len(threads)}")
             item_data = get_thread_data(thread)
+            stats.count("items")
             if item_data != None:
                 scladchina_threads.append(item_data)
             else:
-                logging.info(f"Item {i+1} skipped")
-            i += 1
+                stats.count("skip.item")
 
-        data_to_csv("csv/scladchina.csv", scladchina_threads, is_first_page)
+        with stats.timer("history.merge"):
+            data_to_csv(
+                "csv/scladchina.csv", scladchina_threads, is_first_page
+            )
         is_first_page = False
 
 
@@ -233,6 +235,7 @@ def main() -> None:
     gather_data(url="https://s107.skladchina.biz/")
     end_time = datetime.datetime.now()
     logging.info("Duration: {}".format(end_time - start_time))
+    logging.info(stats.progress_line())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import os
+import csv
+import datetime
+import argparse
+
+from history import NOT_REFRESHED, BaseHistory, CsvHistory
+
+
+class SnapshotLog(BaseHistory):
+    """Append-only long-format history: one (key, run, values) row per item
+
+    Each run appends only its own rows, historical values are never
+    rewritten. A row with an empty key marks the start of a run, so runs
+    without data still get their column in the exported table.
+    """
+
+    def __init__(
+        self, filename: str, values_count: int = 1, checkpoint_every: int = 0
+    ) -> None:
+        super().__init__(filename, values_count, checkpoint_every)
+        self.seen: set[str] = set()
+        self.file = open(filename, "a", encoding="Windows-1251", newline="")
+        self.writer = csv.writer(self.file, delimiter=",")
+
+    def start_snapshot(self, timestamp: str | None = None) -> None:
+        """Start new run in the log"""
+
+        if timestamp is None:
+            timestamp = str(datetime.datetime.now())
+        self.timestamp = timestamp
+        self.seen = set()
+        self.writer.writerow(["", timestamp])
+
+    def resume_snapshot(self, timestamp: str) -> None:
+        """Continue run of interrupted scrape"""
+
+        # rows repeated after the last checkpoint are skipped on export
+
+        self.timestamp = timestamp
+        self.seen = set()
+
+    def merge_rows(self, data: list[list[str]]) -> None:
+        """Append page data of current run"""
+
+        for data_item in data:
+            if data_item[0] in self.seen:
+                continue
+            self.seen.add(data_item[0])
+            self.writer.writerow(
+                [data_item[0], self.timestamp, *data_item[1:]]
+            )
+
+    def mark_unrefreshed(self) -> None:
+        """Append rows of logged items not merged in current run"""
+
+        self.file.flush()
+        keys = {}
+        with open(
+            self.filename, "r", encoding="Windows-1251", newline=""
+        ) as file:
+            for row in csv.reader(file, delimiter=","):
+                if len(row) >= 2 and row[0] != "":
+                    # True when merged in current run, also before resume
+                    keys[row[0]] = keys.get(row[0]) or row[1] == self.timestamp
+        for key, merged in keys.items():
+            if not merged and key not in self.seen:
+                self.merge_rows([[key, *[NOT_REFRESHED] * self.values_count]])
+
+    def write(self) -> None:
+        """Flush appended rows to disk"""
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Flush and close the log"""
+
+        self.save()
+        self.file.close()
+
+
+def export_wide(
+    log_filename: str, csv_filename: str, values_count: int = 1
+) -> None:
+    """Rebuild wide csv table from snapshot log"""
+
+    history = CsvHistory(csv_filename, values_count, load=False)
+    with open(log_filename, "r", encoding="Windows-1251", newline="") as file:
+        reader = csv.reader(file, delimiter=",")
+        for row in reader:
+            if len(row) < 2:
+                continue
+            if row[0] == "":
+                history.start_snapshot(row[1])
+            else:
+                history.merge([[row[0], *row[2:]]])
+    history.close()
+
+
+def main() -> None:
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Export snapshot log to wide csv table"
+    )
+    parser.add_argument("log_filename")
+    parser.add_argument("csv_filename")
+    parser.add_argument("--values-count", type=int, default=1)
+    args = parser.parse_args()
+
+    export_wide(args.log_filename, args.csv_filename, args.values_count)
+
+
+if __name__ == "__main__":
+    main()
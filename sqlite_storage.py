@@ -0,0 +1,175 @@
+import sqlite3
+import datetime
+import argparse
+
+from history import NOT_REFRESHED, BaseHistory, CsvHistory
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    item_id INTEGER NOT NULL REFERENCES items (id),
+    value1 TEXT,
+    value2 TEXT,
+    PRIMARY KEY (run_id, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_item ON metrics (item_id, run_id);
+"""
+
+
+def connect(filename: str) -> sqlite3.Connection:
+    """Open database in WAL mode and create tables"""
+
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SqliteHistory(BaseHistory):
+    """History stored in SQLite: runs, items and per-run metrics tables
+
+    Every merged page is written in one transaction with batched upserts,
+    so the cost of a page does not depend on the size of the history.
+    """
+
+    def __init__(
+        self, filename: str, values_count: int = 1, checkpoint_every: int = 0
+    ) -> None:
+        if values_count not in (1, 2):
+            raise ValueError("SqliteHistory supports 1 or 2 values per item")
+        super().__init__(filename, values_count, checkpoint_every)
+        self.run_id: int | None = None
+        self.connection = connect(filename)
+
+    def start_snapshot(self, timestamp: str | None = None) -> None:
+        """Register new run"""
+
+        if timestamp is None:
+            timestamp = str(datetime.datetime.now())
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at) VALUES (?)", (timestamp,)
+            )
+        self.timestamp = timestamp
+        self.run_id = cursor.lastrowid
+
+    def resume_snapshot(self, timestamp: str) -> None:
+        """Continue run of interrupted scrape"""
+
+        run = self.connection.execute(
+            "SELECT id FROM runs WHERE started_at = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (timestamp,),
+        ).fetchone()
+        if run is None:
+            self.start_snapshot(timestamp)
+        else:
+            self.timestamp = timestamp
+            self.run_id = run[0]
+
+    def merge_rows(self, data: list[list[str]]) -> None:
+        """Upsert page data of current run in one transaction"""
+
+        rows = [
+            (
+                self.run_id,
+                data_item[1],
+                data_item[2] if self.values_count == 2 else None,
+                data_item[0],
+            )
+            for data_item in data
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO items (key) VALUES (?) ON CONFLICT DO NOTHING",
+                [(data_item[0],) for data_item in data],
+            )
+            self.connection.executemany(
+                "INSERT INTO metrics (run_id, item_id, value1, value2) "
+                "SELECT ?, id, ?, ? FROM items WHERE key = ? "
+                "ON CONFLICT DO NOTHING",
+                rows,
+            )
+
+    def mark_unrefreshed(self) -> None:
+        """Add metrics of current run for items not merged in it"""
+
+        value2 = NOT_REFRESHED if self.values_count == 2 else None
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO metrics (run_id, item_id, value1, value2) "
+                "SELECT ?, id, ?, ? FROM items WHERE true "
+                "ON CONFLICT DO NOTHING",
+                (self.run_id, NOT_REFRESHED, value2),
+            )
+
+    def get_item_history(self, key: str) -> list[tuple[str, str, str]]:
+        """Get (run timestamp, value1, value2) of item for all runs"""
+
+        return self.connection.execute(
+            "SELECT runs.started_at, metrics.value1, metrics.value2 "
+            "FROM items "
+            "JOIN metrics ON metrics.item_id = items.id "
+            "JOIN runs ON runs.id = metrics.run_id "
+            "WHERE items.key = ? ORDER BY runs.id",
+            (key,),
+        ).fetchall()
+
+    def write(self) -> None:
+        """Pages are committed on merge, nothing to write"""
+
+    def close(self) -> None:
+        """Close database connection"""
+
+        self.save()
+        self.connection.close()
+
+
+def export_wide(
+    db_filename: str, csv_filename: str, values_count: int = 1
+) -> None:
+    """Rebuild wide csv table from database"""
+
+    connection = connect(db_filename)
+    history = CsvHistory(csv_filename, values_count, load=False)
+    runs = connection.execute(
+        "SELECT id, started_at FROM runs ORDER BY id"
+    ).fetchall()
+    for run_id, started_at in runs:
+        history.start_snapshot(started_at)
+        rows = connection.execute(
+            "SELECT items.key, metrics.value1, metrics.value2 "
+            "FROM metrics JOIN items ON items.id = metrics.item_id "
+            "WHERE metrics.run_id = ? ORDER BY items.id",
+            (run_id,),
+        )
+        history.merge([list(row[: values_count + 1]) for row in rows])
+    connection.close()
+    history.close()
+
+
+def main() -> None:
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Export history database to wide csv table"
+    )
+    parser.add_argument("db_filename")
+    parser.add_argument("csv_filename")
+    parser.add_argument("--values-count", type=int, default=1)
+    args = parser.parse_args()
+
+    export_wide(args.db_filename, args.csv_filename, args.values_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import sys
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+
+from tqdm import tqdm
+
+from checkpoint import replace_file
+
+# upper bounds of histogram buckets, s: 0.5 ms doubling up to ~16 s
+BUCKETS = [0.0005 * 2**i for i in range(16)]
+
+
+class Histogram:
+    """Latency histogram with log-scale buckets"""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add measurement"""
+
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Get upper bound of bucket holding q-th share of measurements"""
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": dict(
+                zip([str(bound) for bound in BUCKETS] + ["inf"], self.counts)
+            ),
+        }
+
+
+class Stats:
+    """Counters, gauges and latency histograms of a run, shared by threads
+
+    Histograms are named `stage.step` (http.ttfb, parse.course,
+    history.write), counters are plain names (http.requests, skip.away).
+    Counters given a host are also kept per host. Gauges hold current
+    values such as queue depths.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all measurements"""
+
+        with self.lock:
+            self.started = time.monotonic()
+            self.counters: dict[str, int] = {}
+            # counter name -> host -> value
+            self.host_counters: dict[str, dict[str, int]] = {}
+            self.gauges: dict[str, float] = {}
+            self.histograms: dict[str, Histogram] = {}
+
+    def count(
+        self, name: str, value: int = 1, host: str | None = None
+    ) -> None:
+        """Increase counter, and its counter of host if given"""
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if host is not None:
+                hosts = self.host_counters.setdefault(name, {})
+                hosts[host] = hosts.get(host, 0) + value
+
+    def mean(self, name: str) -> float:
+        """Get mean of histogram measurements, 0 when none"""
+
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None or histogram.count == 0:
+                return 0.0
+            return histogram.sum / histogram.count
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set current value of gauge"""
+
+        with self.lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name: str, delta: float) -> None:
+        """Change current value of gauge"""
+
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add measurement to histogram"""
+
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Measure run time of block into histogram"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Get all measurements"""
+
+        with self.lock:
+            return {
+                "elapsed": time.monotonic() - self.started,
+                "counters": dict(sorted(self.counters.items())),
+                "host_counters": {
+                    name: dict(sorted(hosts.items()))
+                    for name, hosts in sorted(self.host_counters.items())
+                },
+                "gauges": dict(sorted(self.gauges.items())),
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def progress_line(self) -> str:
+        """Get one line summary: counters and median of histograms"""
+
+        snapshot = self.snapshot()
+        elapsed = snapshot["elapsed"]
+        parts = [str(datetime.timedelta(seconds=int(elapsed)))]
+        for name, value in snapshot["counters"].items():
+            if name == "http.bytes":
+                parts.append(f"{name}={value / 1e6:.1f}MB")
+            else:
+                parts.append(f"{name}={value}")
+        for name, value in snapshot["gauges"].items():
+            parts.append(f"{name}={value:g}")
+        requests = snapshot["counters"].get("http.requests", 0)
+        if elapsed > 0:
+            parts.append(f"({requests / elapsed:.1f} req/s)")
+        for name, histogram in snapshot["histograms"].items():
+            parts.append(f"{name} p50={histogram['p50'] * 1000:.1f}ms")
+        return " ".join(parts)
+
+    def save(self, filename: str) -> None:
+        """Write measurements to json file"""
+
+        snapshot = self.snapshot()
+        replace_file(
+            filename,
+            lambda file: json.dump(snapshot, file, indent=2),
+            encoding="utf-8",
+        )
+
+
+stats = Stats()
+
+
+class ProgressReporter(threading.Thread):
+    """Prints stats progress line every `interval` seconds"""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            tqdm.write(stats.progress_line(), file=sys.stderr)
+
+    def stop(self) -> None:
+        self.stopped.set()
@@ -0,0 +1,83 @@
+import os
+from contextlib import contextmanager
+
+from checkpoint import load_checkpoint, remove_checkpoint
+from history import CsvHistory
+from limits import LimitReached, limit
+from snapshot_log import SnapshotLog
+from sqlite_storage import SqliteHistory
+
+History = CsvHistory | SnapshotLog | SqliteHistory
+
+STORAGE_MODES = ("csv", "log", "sqlite")
+# extension of history files of modes not writing the wide table
+EXTENSIONS = {"log": ".log.csv", "sqlite": ".sqlite"}
+
+
+def default_filename(filename: str, mode: str) -> str:
+    """Get default history file name of storage mode
+
+    Every mode writes its own file format, so a log never goes into
+    the wide table of the same scraper.
+    """
+
+    if mode not in EXTENSIONS:
+        return filename
+    return os.path.splitext(filename)[0] + EXTENSIONS[mode]
+
+
+def open_history(
+    mode: str,
+    filename: str,
+    values_count: int = 1,
+    checkpoint_every: int = 0,
+) -> History:
+    """Open history storage of given mode"""
+
+    if mode == "log":
+        return SnapshotLog(filename, values_count, checkpoint_every)
+    if mode == "sqlite":
+        return SqliteHistory(filename, values_count, checkpoint_every)
+    if mode == "csv":
+        return CsvHistory(filename, values_count, checkpoint_every)
+    raise ValueError(f"Unknown storage mode: {mode}")
+
+
+def start_run(history: History, resume: bool = False) -> dict:
+    """Start new snapshot or continue interrupted one, get its progress"""
+
+    checkpoint = load_checkpoint(history.filename) if resume else None
+    if checkpoint is None:
+        history.start_snapshot()
+        return {}
+    history.resume_snapshot(checkpoint["timestamp"])
+    history.progress = checkpoint["progress"]
+    return checkpoint["progress"]
+
+
+def finish_run(history: History) -> None:
+    """Mark run as completed"""
+
+    remove_checkpoint(history.filename)
+
+
+@contextmanager
+def run(history: History, resume: bool = False):
+    """Run of a scraper into history, yields progress of resumed run
+
+    When the run limit is reached the snapshot is finished with items
+    not merged marked as not refreshed. History is closed in any case,
+    the run is marked completed unless it failed.
+    """
+
+    progress = start_run(history, resume)
+    try:
+        yield progress
+        if limit.stopped:
+            raise LimitReached()
+    except LimitReached:
+        # finish run with all items in snapshot
+        history.mark_unrefreshed()
+    finally:
+        history.close()
+    finish_run(history)
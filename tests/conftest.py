@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import client
+from mock_site import MockSite, serve_in_thread
+
+
+@pytest.fixture
+def site():
+    """Small mock site all requests of the test go to, unthrottled"""
+
+    site = MockSite(
+        catalog_pages=3,
+        items_per_page=6,
+        authors_pages=2,
+        sections=2,
+        section_pages=2,
+        threads_per_page=4,
+    )
+    base, stop = serve_in_thread(site)
+    client.use_base_url(base)
+    client.throttle.configure(rate=1e6, burst=1e6, max_concurrency=1e6)
+    yield site
+    client.use_base_url(None)
+    stop()
@@ -0,0 +1,85 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+import client
+from stats import stats
+
+COURSE = "https://info-hit.ru/course/1/"
+
+
+def fetch_sync() -> str:
+    return client.create_session().get(COURSE, verify=False).text
+
+
+def fetch_async() -> str:
+    async def fetch() -> str:
+        async with aiohttp.ClientSession() as session:
+            return await client.fetch_text(session, COURSE, {})
+
+    return asyncio.run(fetch())
+
+
+def open_cache(directory, ttl: float | None = None) -> None:
+    ttls = [] if ttl == None else [(r"/course/", ttl)]
+    client.cache.open(str(directory), ttls=ttls)
+    stats.reset()
+
+
+@pytest.fixture
+def cache_dir(site, tmp_path):
+    yield tmp_path / "cache"
+    client.cache.close()
+
+
+def cache_counters() -> dict[str, int]:
+    counters = stats.snapshot()["counters"]
+    return {
+        name: counters.get(f"cache.{name}", 0)
+        for name in ("hit", "miss", "revalidated")
+    }
+
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async])
+def test_fresh_entry_is_hit(site, cache_dir, fetch):
+    open_cache(cache_dir)
+    first = fetch()
+    second = fetch()
+    assert second == first
+    assert site.requests == 1
+    assert cache_counters() == {"hit": 1, "miss": 1, "revalidated": 0}
+
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async])
+def test_expired_entry_is_revalidated(site, cache_dir, fetch):
+    open_cache(cache_dir, ttl=0)
+    first = fetch()
+    stored_at = client.cache.get(client.rebase(COURSE, {})).stored_at
+    assert fetch() == first
+    assert site.requests == 2
+    assert cache_counters() == {"hit": 0, "miss": 1, "revalidated": 1}
+    # 304 refreshes the entry
+    assert client.cache.get(client.rebase(COURSE, {})).stored_at > stored_at
+
+
+def test_changed_page_replaces_expired_entry(site, cache_dir):
+    open_cache(cache_dir, ttl=0)
+    first = fetch_sync()
+    site.seed += 1
+    second = fetch_sync()
+    assert second != first
+    assert cache_counters() == {"hit": 0, "miss": 2, "revalidated": 0}
+    entry = client.cache.get(client.rebase(COURSE, {}))
+    assert client.cache.read(entry) == second.encode()
+
+
+def test_async_run_hits_entries_of_sync_run(site, cache_dir):
+    open_cache(cache_dir)
+    first = fetch_sync()
+    client.cache.close()
+    # cache is kept on disk between runs
+    open_cache(cache_dir)
+    assert fetch_async() == first
+    assert site.requests == 1
+    assert cache_counters() == {"hit": 1, "miss": 0, "revalidated": 0}
@@ -0,0 +1,71 @@
+import csv
+
+import pytest
+
+import courses
+import snapshot_log
+import sqlite_storage
+from checkpoint import checkpoint_filename, load_checkpoint
+
+CATALOG = "https://info-hit.ru/catalog"
+EXPORTS = {
+    "csv": None,
+    "log": snapshot_log.export_wide,
+    "sqlite": sqlite_storage.export_wide,
+}
+
+
+class Interrupted(Exception):
+    pass
+
+
+def read_table(filename: str, storage: str) -> list[list[str]]:
+    if EXPORTS[storage] != None:
+        EXPORTS[storage](filename, f"{filename}.wide.csv")
+        filename = f"{filename}.wide.csv"
+    with open(filename, encoding="cp1251", newline="") as file:
+        return list(csv.reader(file))
+
+
+def crawl(filename: str, storage: str, resume: bool = False) -> None:
+    courses.gather_data(
+        CATALOG, filename, checkpoint_every=1, storage=storage, resume=resume
+    )
+
+
+@pytest.mark.parametrize("storage", sorted(EXPORTS))
+def test_resumed_run_equals_uninterrupted(
+    site, tmp_path, monkeypatch, storage
+):
+    expected_filename = str(tmp_path / "expected.csv")
+    crawl(expected_filename, storage)
+    crawl(expected_filename, storage)
+    expected = read_table(expected_filename, storage)
+
+    filename = str(tmp_path / "courses.csv")
+    crawl(filename, storage)
+    get_page_data = courses.get_page_data
+
+    def interrupt_last_page(url_page, *args):
+        if url_page.endswith(f"PAGEN_1={site.catalog_pages}"):
+            raise Interrupted()
+        return get_page_data(url_page, *args)
+
+    monkeypatch.setattr(courses, "get_page_data", interrupt_last_page)
+    with pytest.raises(Interrupted):
+        crawl(filename, storage)
+    checkpoint = load_checkpoint(filename)
+    assert checkpoint["progress"] == {"page": site.catalog_pages - 1}
+
+    monkeypatch.setattr(courses, "get_page_data", get_page_data)
+    requests = site.requests
+    crawl(filename, storage, resume=True)
+    # first catalog page and the rest of the run
+    assert site.requests - requests == 1 + site.items_per_page
+    assert load_checkpoint(filename) == None
+    assert not (tmp_path / checkpoint_filename("courses.csv")).exists()
+
+    rows = read_table(filename, storage)
+    # timestamps of the runs differ
+    assert len(rows[0]) == len(expected[0]) == 3
+    assert rows[1:] == expected[1:]
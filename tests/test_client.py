@@ -0,0 +1,54 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+import client
+from extract import WeeklyViewsScanner
+from stats import stats
+
+COURSE = "https://info-hit.ru/course/1/"
+
+
+def fetch_sync() -> None:
+    session = client.create_session()
+    session.get(COURSE, verify=False)
+
+
+def fetch_async() -> None:
+    async def fetch() -> None:
+        async with aiohttp.ClientSession() as session:
+            await client.fetch_text(session, COURSE, {})
+
+    asyncio.run(fetch())
+
+
+def stream_async() -> None:
+    async def stream() -> None:
+        async with aiohttp.ClientSession() as session:
+            await client.stream_page_async(
+                session, COURSE, {}, WeeklyViewsScanner()
+            )
+
+    asyncio.run(stream())
+
+
+@pytest.fixture
+def failing_site(site, monkeypatch):
+    monkeypatch.setattr(client, "retry_delay", lambda attempt, after: 0)
+    site.error_rate = 1.0
+    return site
+
+
+@pytest.mark.parametrize("fetch", [fetch_sync, fetch_async, stream_async])
+def test_retries_are_counted_alike(failing_site, fetch):
+    stats.reset()
+    fetch()
+    counters = stats.snapshot()["counters"]
+    attempts = client.STATUS_RETRIES + 1
+    assert failing_site.requests == attempts
+    assert counters["http.requests"] == attempts
+    assert counters["http.retries"] == attempts - 1
+    assert counters["http.failed"] == attempts
+    assert stats.snapshot()["histograms"]["http.ttfb"]["count"] == attempts
+    assert all(host.in_flight == 0 for host in client.throttle.hosts.values())
@@ -0,0 +1,99 @@
+import pytest
+
+from extract import EXTRACTORS, WeeklyViewsScanner
+from mock_site import MockSite
+
+SITE = MockSite(catalog_pages=3, authors_pages=2, section_pages=3)
+ONE_PAGE_SITE = MockSite(section_pages=1)
+# catalog layout of course cards, not served by the mock site
+CARDS_PAGE = (
+    '<html><body><div class="courses-cards__list__item">'
+    '<a class="course-card__wrap" href="/course/7/">Course 7</a></div>'
+    '<div class="courses-cards__list__item">'
+    '<a class="course-card__wrap big" href="/course/8/">Course 8</a></div>'
+    "</body></html>"
+)
+
+# rating spans the fast pattern of the scanner has to handle
+RATING_PAGES = [
+    "<html><body><span class='cp-hero__rating-text big' id=r>"
+    "<b>42</b> просмотров за неделю</span></body></html>",
+    '<html><body><span class="cp-hero__rating-text-old">1</span>'
+    '<span\n class = "x cp-hero__rating-text">7 за неделю</span>'
+    "</body></html>",
+    # no digits, scanner leaves the page to the extractor
+    '<html><body><span class="cp-hero__rating-text">'
+    "нет просмотров</span></body></html>",
+]
+
+# extractor method -> pages it parses
+PAGES = {
+    "pages_count": [SITE.catalog(1), SITE.catalog(3), SITE.authors(1)],
+    "items_urls": [SITE.catalog(1), SITE.catalog(4), CARDS_PAGE],
+    # every tenth course has no rating
+    "weekly_views": [SITE.course(number) for number in range(1, 12)],
+    "authors": [SITE.authors(1), SITE.authors(2), SITE.authors(3)],
+    "scladchins_urls": [SITE.forum()],
+    "threads_pages_count": [SITE.section(1, 1), ONE_PAGE_SITE.section(1, 1)],
+    "threads": [SITE.section(1, 1), SITE.section(2, 3), SITE.section(1, 4)],
+}
+
+
+def test_every_method_is_checked():
+    methods = {
+        name
+        for name in dir(EXTRACTORS["lxml"])
+        if not name.startswith("_")
+    }
+    assert methods == set(PAGES)
+
+
+@pytest.mark.parametrize("method", sorted(PAGES))
+def test_backends_extract_same_data(method):
+    lxml = getattr(EXTRACTORS["lxml"], method)
+    bs4 = getattr(EXTRACTORS["bs4"], method)
+    for html in PAGES[method]:
+        assert lxml(html) == bs4(html)
+
+
+def scan(html: str, chunk_size: int) -> tuple[str | None, str | None]:
+    """Get value found by scanner and page text left for full parse"""
+
+    body = html.encode("utf-8")
+    scanner = WeeklyViewsScanner()
+    for start in range(0, len(body), chunk_size):
+        if scanner.feed(body[start : start + chunk_size]):
+            return scanner.value, None
+    return scanner.value, scanner.text("utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 16 * 1024])
+def test_scanner_agrees_with_extractor(chunk_size):
+    weekly_views = EXTRACTORS["lxml"].weekly_views
+    for html in PAGES["weekly_views"] + RATING_PAGES:
+        value, text = scan(html, chunk_size)
+        if text != None:
+            assert value == None
+            assert text == html
+            value = weekly_views(text)
+        assert value == weekly_views(html)
+
+
+def test_scanner_finds_span_split_at_any_byte():
+    html = SITE.course(1)
+    expected = EXTRACTORS["lxml"].weekly_views(html)
+    body = html.encode("utf-8")
+    for split in range(1, len(body)):
+        scanner = WeeklyViewsScanner()
+        found = scanner.feed(body[:split]) or scanner.feed(body[split:])
+        assert found
+        assert scanner.value == expected
+
+
+def test_scanner_without_digits_falls_back_to_full_parse():
+    # digits after the span are not weekly views
+    html = RATING_PAGES[2].replace("</body>", "<p>5 курсов</p></body>")
+    scanner = WeeklyViewsScanner()
+    assert not scanner.feed(html.encode("utf-8"))
+    assert scanner.value == None
+    assert scanner.text("utf-8") == html
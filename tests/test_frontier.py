@@ -0,0 +1,62 @@
+import pytest
+
+from frontier import Frontier, canonical_url
+
+FORUM = "https://s107.skladchina.biz"
+
+
+@pytest.mark.parametrize(
+    "url, canonical",
+    [
+        ("HTTPS://S107.Skladchina.biz:443/forums/", f"{FORUM}/forums/"),
+        ("http://s107.skladchina.biz:80/", "http://s107.skladchina.biz/"),
+        (f"{FORUM}:8443/forums/", f"{FORUM}:8443/forums/"),
+        (f"{FORUM}//forums///page-2", f"{FORUM}/forums/page-2"),
+        (f"{FORUM}", f"{FORUM}/"),
+        (f"{FORUM}/find?b=2&a=1&c=", f"{FORUM}/find?a=1&b=2&c="),
+        (f"{FORUM}/forums/#posts", f"{FORUM}/forums/"),
+        (f"{FORUM}/threads/some-course.123/", f"{FORUM}/threads/123/"),
+        (f"{FORUM}/threads/renamed.123/page-3", f"{FORUM}/threads/123/"),
+        (f"{FORUM}/threads/123", f"{FORUM}/threads/123/"),
+        (" /threads/course.7/ ", f"{FORUM}/threads/7/"),
+    ],
+)
+def test_canonical_url(url, canonical):
+    assert canonical_url(url, f"{FORUM}/forums/") == canonical
+
+
+def test_resume_gets_urls_saved_before_interruption(tmp_path):
+    filename = str(tmp_path / "threads.csv")
+    urls = [f"{FORUM}/threads/{number}/" for number in range(1000, 0, -7)]
+    frontier = Frontier(filename)
+    frontier.start_run("run 1")
+    for url in urls[:50]:
+        assert frontier.add(url)
+    frontier.save()
+    for url in urls[50:100]:
+        assert frontier.add(url)
+    frontier.save()
+    # added after the last checkpoint, lost with the interrupted run
+    frontier.add(urls[100])
+
+    resumed = Frontier(filename)
+    resumed.start_run("run 1")
+    assert list(resumed.keys) == sorted(resumed.keys)
+    assert all(url in resumed for url in urls[:100])
+    assert urls[100] not in resumed
+    assert not resumed.add(urls[0])
+    assert resumed.add(urls[100])
+
+
+def test_new_run_starts_empty(tmp_path):
+    filename = str(tmp_path / "threads.csv")
+    frontier = Frontier(filename)
+    frontier.start_run("run 1")
+    frontier.add(f"{FORUM}/threads/1/")
+    frontier.save()
+
+    frontier.start_run("run 2")
+    assert f"{FORUM}/threads/1/" not in frontier
+    frontier.remove()
+    frontier.start_run("run 1")
+    assert len(frontier.keys) == 0
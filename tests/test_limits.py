@@ -0,0 +1,47 @@
+import csv
+
+import pytest
+
+import courses
+import snapshot_log
+import sqlite_storage
+from history import NOT_REFRESHED
+from limits import limit
+
+CATALOG = "https://info-hit.ru/catalog"
+EXPORTS = {
+    "csv": None,
+    "log": snapshot_log.export_wide,
+    "sqlite": sqlite_storage.export_wide,
+}
+
+
+def read_table(filename: str, storage: str) -> list[list[str]]:
+    if EXPORTS[storage] != None:
+        EXPORTS[storage](filename, f"{filename}.wide.csv")
+        filename = f"{filename}.wide.csv"
+    with open(filename, encoding="cp1251", newline="") as file:
+        return list(csv.reader(file))
+
+
+@pytest.fixture
+def limited():
+    yield limit
+    limit.configure()
+
+
+@pytest.mark.parametrize("storage", sorted(EXPORTS))
+def test_limited_run_marks_only_known_items(site, tmp_path, storage, limited):
+    filename = str(tmp_path / "courses.csv")
+    courses.gather_data(CATALOG, filename, storage=storage)
+    known = {row[0] for row in read_table(filename, storage)[1:]}
+    # catalog lists /course/10/, it has no rating and no row
+    assert "/course/10/" not in known
+
+    limited.configure(max_requests=6)
+    courses.gather_data(CATALOG, filename, storage=storage)
+    rows = read_table(filename, storage)
+    assert {row[0] for row in rows[1:]} == known
+    assert all(len(row) == len(rows[0]) for row in rows[1:])
+    last = [row[-1] for row in rows[1:]]
+    assert 0 < last.count(NOT_REFRESHED) < len(last)
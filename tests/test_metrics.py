@@ -0,0 +1,75 @@
+import urllib.request
+
+import pytest
+
+import courses
+from metrics import CONTENT_TYPE, start_metrics_server
+from stats import stats
+
+CATALOG = "https://info-hit.ru/catalog"
+
+
+def parse_families(text: str) -> dict[str, dict]:
+    """Parse Prometheus text format into families with their samples"""
+
+    families = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help_text = line[len("# HELP ") :].split(" ", 1)
+            families[name] = {"help": help_text, "samples": []}
+        elif line.startswith("# TYPE "):
+            name, kind = line[len("# TYPE ") :].split(" ")
+            families[name]["type"] = kind
+        else:
+            sample, value = line.rsplit(" ", 1)
+            name, _, labels = sample.partition("{")
+            family = name
+            if family not in families:
+                # _bucket, _sum and _count samples of histogram
+                family = name.rsplit("_", 1)[0]
+                assert families[family]["type"] == "histogram"
+            families[family]["samples"].append(
+                (name, labels.rstrip("}"), float(value))
+            )
+    return families
+
+
+@pytest.fixture
+def metrics_url():
+    server = start_metrics_server(0)
+    yield f"http://127.0.0.1:{server.server_port}/metrics"
+    server.shutdown()
+    server.server_close()
+
+
+def test_metrics_after_crawl(site, tmp_path, metrics_url):
+    stats.reset()
+    courses.gather_data(CATALOG, str(tmp_path / "courses.csv"), workers=2)
+    with urllib.request.urlopen(metrics_url) as response:
+        assert response.headers["Content-Type"] == CONTENT_TYPE
+        families = parse_families(response.read().decode("utf-8"))
+
+    assert all("type" in family for family in families.values())
+    requests = families["scraper_http_requests_total"]
+    assert requests["type"] == "counter"
+    assert requests["samples"][0][2] == site.requests
+
+    in_flight = families["scraper_in_flight_requests"]
+    assert in_flight["type"] == "gauge"
+    assert in_flight["samples"]
+    for _, labels, value in in_flight["samples"]:
+        assert labels.startswith('host="')
+        assert value == 0
+
+    ttfb = families["scraper_http_ttfb_seconds"]
+    assert ttfb["type"] == "histogram"
+    buckets = [
+        value
+        for name, _, value in ttfb["samples"]
+        if name.endswith("_bucket")
+    ]
+    assert buckets == sorted(buckets)
+    count = [
+        value for name, _, value in ttfb["samples"] if name.endswith("_count")
+    ]
+    assert count == [buckets[-1]] == [site.requests]
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from pipeline import Pipeline
+
+
+class TaskError(Exception):
+    pass
+
+
+def test_results_written_in_task_order():
+    def fetch(task, value):
+        time.sleep(0.001 * (task % 3))
+        return value * 2
+
+    pipeline = Pipeline(
+        [("fetch", fetch, 4), ("parse", lambda task, value: value + 1, 2)],
+        queue_size=2,
+    )
+    written = []
+    pipeline.run(range(100), lambda task, value: written.append((task, value)))
+    assert written == [(task, task * 2 + 1) for task in range(100)]
+
+
+def test_earliest_failed_task_wins():
+    # task 20 fails first, task 5 fails later but comes earlier in order
+    def fetch(task, value):
+        if task == 5:
+            time.sleep(0.2)
+            raise TaskError(task)
+        if task == 20:
+            raise TaskError(task)
+        return value
+
+    pipeline = Pipeline([("fetch", fetch, 4)], queue_size=16)
+    written = []
+    with pytest.raises(TaskError) as error:
+        pipeline.run(range(50), lambda task, value: written.append(task))
+    assert error.value.args == (5,)
+    assert written == list(range(5))
+
+
+def test_tasks_before_failure_are_written():
+    def parse(task, value):
+        if task == 30:
+            raise TaskError(task)
+        time.sleep(0.001 * (task % 4))
+        return value
+
+    pipeline = Pipeline(
+        [("fetch", lambda task, value: value, 3), ("parse", parse, 3)],
+        queue_size=1,
+    )
+    written = []
+    with pytest.raises(TaskError):
+        pipeline.run(range(100), lambda task, value: written.append(task))
+    assert written == list(range(30))
+
+
+def test_writer_error_stops_pipeline():
+    def write(task, value):
+        written.append(task)
+        if task == 10:
+            raise TaskError(task)
+
+    pipeline = Pipeline([("fetch", lambda task, value: value, 2)])
+    written = []
+    with pytest.raises(TaskError):
+        pipeline.run(range(1000), write)
+    assert written == list(range(11))
@@ -0,0 +1,24 @@
+import threading
+
+from profiling import Profiler
+
+
+def work_in_thread() -> int:
+    return sum(number * number for number in range(1000))
+
+
+def test_threads_are_profiled():
+    profiler = Profiler()
+    profiler.start()
+    try:
+        threads = [threading.Thread(target=work_in_thread) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        profiler.stop()
+    functions = [
+        function for _, _, function in profiler.cpu_stats().stats
+    ]
+    assert "work_in_thread" in functions
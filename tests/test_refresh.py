@@ -0,0 +1,47 @@
+import asyncio
+import csv
+
+import pytest
+
+import a_courses
+import courses
+from refresh import RefreshState
+
+CATALOG = "https://info-hit.ru/catalog"
+
+
+def read_rows(filename: str) -> list[list[str]]:
+    with open(filename, encoding="cp1251", newline="") as file:
+        return list(csv.reader(file))
+
+
+def crawl(engine: str, filename: str, budget: int | None = None) -> None:
+    refresh = RefreshState(filename, budget=budget)
+    if engine == "async":
+        asyncio.run(
+            a_courses.gather_data(
+                CATALOG, filename, concurrency=4, refresh=refresh
+            )
+        )
+    else:
+        courses.gather_data(CATALOG, filename, workers=2, refresh=refresh)
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+@pytest.mark.parametrize("budget", [None, 4])
+def test_incremental_crawl_twice(site, tmp_path, engine, budget):
+    filename = str(tmp_path / "courses.csv")
+    crawl(engine, filename, budget)
+    first_requests = site.requests
+    crawl(engine, filename, budget)
+
+    rows = read_rows(filename)
+    assert len(rows[0]) == 3
+    assert all(len(row) == 3 for row in rows[1:])
+    refresh = RefreshState(filename)
+    assert refresh.run == 2
+    fetched = [key for key, item in refresh.items.items() if item[0] == 2]
+    if budget != None:
+        assert len(fetched) <= budget
+    # catalog pages are read every run, course pages only when stale
+    assert site.requests - first_requests == 3 + len(fetched)
@@ -0,0 +1,20 @@
+from cli import build_parser, configure_client
+from storage import default_filename
+
+
+def test_storage_modes_get_own_default_files():
+    assert default_filename("E:/courses.csv", "csv") == "E:/courses.csv"
+    assert default_filename("E:/courses.csv", "log") == "E:/courses.log.csv"
+    assert default_filename("E:/courses.csv", "sqlite") == "E:/courses.sqlite"
+
+
+def test_output_option_wins_over_default():
+    parser = build_parser("test", None, "courses.csv")
+    args = parser.parse_args(
+        ["--storage", "log", "--output", "x.csv", "--progress-every", "0"]
+    )
+    configure_client(args)
+    assert args.output == "x.csv"
+    args = parser.parse_args(["--storage", "log", "--progress-every", "0"])
+    configure_client(args)
+    assert args.output == "courses.log.csv"
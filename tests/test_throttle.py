@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from throttle import AimdLimiter, HostThrottle, TokenBucket
+
+
+def host_throttle(concurrency: int) -> HostThrottle:
+    return HostThrottle(
+        TokenBucket(1e6, 1e6),
+        AimdLimiter(initial=concurrency, maximum=concurrency),
+    )
+
+
+def test_async_waiters_keep_concurrency_limit():
+    host = host_throttle(2)
+    in_flight = []
+
+    async def request() -> None:
+        await host.acquire_async()
+        in_flight.append(host.in_flight)
+        await asyncio.sleep(0.005)
+        host.release(200, 0.005)
+
+    async def main() -> None:
+        await asyncio.wait_for(
+            asyncio.gather(*[request() for _ in range(20)]), 5
+        )
+
+    asyncio.run(main())
+    assert len(in_flight) == 20
+    assert max(in_flight) <= 2
+    assert host.in_flight == 0
+    assert host.waiters == []
+
+
+def test_release_from_thread_wakes_async_waiter():
+    host = host_throttle(1)
+    host.acquire()
+
+    async def main() -> None:
+        waiting = asyncio.create_task(host.acquire_async())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        threading.Thread(target=host.release, args=(200, 0.01)).start()
+        await asyncio.wait_for(waiting, 5)
+
+    asyncio.run(main())
+    assert host.in_flight == 1
+
+
+def test_cancelled_waiter_is_forgotten():
+    host = host_throttle(1)
+    host.acquire()
+
+    async def main() -> None:
+        waiting = asyncio.create_task(host.acquire_async())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(main())
+    assert host.waiters == []
+    host.release(200, 0.01)
+    assert host.in_flight == 0
+
+
+def test_fast_outlier_does_not_pin_limit():
+    limiter = AimdLimiter(initial=4, maximum=16)
+    limiter.on_response(200, 0.05)
+    for _ in range(2000):
+        limiter.on_response(200, 0.12)
+    assert limiter.limit == 16
+
+
+def test_rising_latency_decreases_limit():
+    limiter = AimdLimiter(initial=8, maximum=16)
+    for _ in range(50):
+        limiter.on_response(200, 0.05)
+    limit = limiter.limit
+    for _ in range(10):
+        limiter.on_response(200, 1.0)
+    assert limiter.limit < limit
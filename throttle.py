@@ -0,0 +1,209 @@
+import time
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Token bucket: `rate` requests per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, get seconds to wait before using it"""
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class AimdLimiter:
+    """Concurrency limit with additive increase, multiplicative decrease
+
+    The limit grows by `increase` per round trip while responses are
+    fine and latency stays within `latency_factor` of the base latency.
+    On 429, 5xx, connection errors or rising latency it is multiplied by
+    `decrease`, at most once per round trip. The base latency is the
+    lowest smoothed latency, rising by `base_drift` per response so that
+    an early fast outlier does not make normal latency look congested.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        minimum: float = 1,
+        maximum: float = 64,
+        increase: float = 1,
+        decrease: float = 0.5,
+        latency_factor: float = 2.0,
+        base_drift: float = 0.01,
+    ) -> None:
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.base_drift = base_drift
+        self.latency: float | None = None
+        self.base_latency: float | None = None
+        self.decreased = 0.0
+
+    def on_response(self, status: int | None, latency: float) -> None:
+        """Tune limit by response status (None - error) and latency"""
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+        if self.base_latency is None:
+            self.base_latency = self.latency
+        else:
+            self.base_latency = min(
+                self.latency, self.base_latency * (1 + self.base_drift)
+            )
+
+        congested = (
+            status is None
+            or status in RETRY_STATUSES
+            or self.latency > self.latency_factor * self.base_latency
+        )
+        now = time.monotonic()
+        if congested:
+            if now - self.decreased >= self.latency:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.decreased = now
+        else:
+            self.limit = min(
+                self.maximum, self.limit + self.increase / self.limit
+            )
+
+
+def wake(waiter: asyncio.Future) -> None:
+    """Resume coroutine waiting on future unless it is cancelled"""
+
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class HostThrottle:
+    """Rate and concurrency limits of one host"""
+
+    def __init__(self, bucket: TokenBucket, limiter: AimdLimiter) -> None:
+        self.bucket = bucket
+        self.limiter = limiter
+        # requests awaiting response headers
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        # futures of coroutines waiting for a slot, of any event loop
+        self.waiters: list[asyncio.Future] = []
+
+    def acquire(self) -> None:
+        """Wait for concurrency slot and rate token"""
+
+        with self.condition:
+            while self.in_flight >= int(self.limiter.limit):
+                self.condition.wait(0.1)
+            self.in_flight += 1
+        time.sleep(self.bucket.reserve())
+
+    async def acquire_async(self) -> None:
+        """Wait for concurrency slot and rate token without blocking loop
+
+        A waiting coroutine sleeps until `release`, called from any thread,
+        wakes it up.
+        """
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.limiter.limit):
+                    self.in_flight += 1
+                    break
+                waiter = loop.create_future()
+                self.waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                with self.condition:
+                    if waiter in self.waiters:
+                        self.waiters.remove(waiter)
+        await asyncio.sleep(self.bucket.reserve())
+
+    def release(self, status: int | None, latency: float) -> None:
+        """Free concurrency slot and report response"""
+
+        with self.condition:
+            self.in_flight -= 1
+            self.limiter.on_response(status, latency)
+            self.condition.notify_all()
+            waiters = self.waiters
+            self.waiters = []
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(wake, waiter)
+
+
+class Throttle:
+    """Per-host throttles shared by all sessions of a run"""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: float = 20.0,
+        concurrency: float = 4,
+        max_concurrency: float = 32,
+    ) -> None:
+        self.hosts: dict[str, HostThrottle] = {}
+        self.lock = threading.Lock()
+        self.configure(rate, burst, concurrency, max_concurrency)
+
+    def configure(
+        self,
+        rate: float = 10.0,
+        burst: float = 20.0,
+        concurrency: float = 4,
+        max_concurrency: float = 32,
+    ) -> None:
+        """Set limits of hosts seen from now on"""
+
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+
+    def host(self, url: str) -> HostThrottle:
+        """Get throttle of url host"""
+
+        netloc = urlsplit(url).netloc
+        with self.lock:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = HostThrottle(
+                    TokenBucket(self.rate, self.burst),
+                    AimdLimiter(
+                        initial=min(self.concurrency, self.max_concurrency),
+                        maximum=self.max_concurrency,
+                    ),
+                )
+            return self.hosts[netloc]
+
+
+def retry_delay(attempt: int, retry_after: str | None) -> float:
+    """Get delay before retry of throttled request"""
+
+    if retry_after is not None and retry_after.isdigit():
+        return float(retry_after)
+    return 0.5 * 2**attempt
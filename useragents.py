@@ -0,0 +1,46 @@
+import os
+import random
+import weakref
+import threading
+from functools import lru_cache
+
+POOL_FILENAME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "user_agents.txt"
+)
+
+
+@lru_cache(maxsize=None)
+def user_agents() -> tuple[str, ...]:
+    """Get bundled desktop browser user agents, read on first use"""
+
+    with open(POOL_FILENAME, encoding="utf-8") as file:
+        return tuple(line.strip() for line in file if line.strip())
+
+
+def random_user_agent() -> str:
+    """Get random user agent of the pool"""
+
+    return random.choice(user_agents())
+
+
+class UserAgentRotation:
+    """User agent of every session, or a new one for every request
+
+    Sessions are requests adapters or aiohttp client sessions, a session
+    keeps its user agent for its lifetime unless `per_request` is set.
+    """
+
+    def __init__(self, per_request: bool = False) -> None:
+        self.per_request = per_request
+        self.sessions = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def user_agent(self, session) -> str:
+        """Get user agent for next request of session"""
+
+        if self.per_request:
+            return random_user_agent()
+        with self.lock:
+            if session not in self.sessions:
+                self.sessions[session] = random_user_agent()
+            return self.sessions[session]